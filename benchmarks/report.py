@@ -0,0 +1,93 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+# Metrics where a higher value is a regression, and where a lower one is
+HIGHER_IS_WORSE = ("p50_seconds", "p95_seconds", "peak_rss_mb")
+LOWER_IS_WORSE = ("throughput_per_second",)
+
+
+def summarize(latencies: list, wall_seconds: float, errors: int = 0, audio_seconds: float = None) -> dict:
+    latencies = np.asarray(latencies, dtype=np.float64)
+    result = {
+        "calls": int(len(latencies)),
+        "errors": errors,
+        "p50_seconds": round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+        "p95_seconds": round(float(np.percentile(latencies, 95)), 4) if len(latencies) else None,
+        "throughput_per_second": round(len(latencies) / wall_seconds, 4) if wall_seconds > 0 else None,
+    }
+    if audio_seconds and len(latencies):
+        # Processing seconds per second of audio at the median; below 1 is faster than real time
+        result["real_time_factor"] = round(result["p50_seconds"] / audio_seconds, 4)
+    return result
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class RSSSampler:
+    """Tracks peak resident memory of this process plus its live children (pool workers, manager)."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> float:
+        pids = [os.getpid()] + [child.pid for child in multiprocessing.active_children()]
+        return sum(_rss_mb(pid) for pid in pids)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self._sample())
+
+    def __enter__(self):
+        self.peak_mb = self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = round(max(self.peak_mb, self._sample()), 1)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return one message per metric that moved the wrong way by more than `threshold` (a fraction)."""
+    regressions = []
+    for case, metrics in results["cases"].items():
+        reference = baseline.get("cases", {}).get(case)
+        if not reference:
+            continue
+        for name in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            current, previous = metrics.get(name), reference.get(name)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous
+            if (name in HIGHER_IS_WORSE and change > threshold) or (name in LOWER_IS_WORSE and -change > threshold):
+                regressions.append(f"{case} {name}: {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(path: str, data: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
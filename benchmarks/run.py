@@ -0,0 +1,227 @@
+"""Offline, CPU-only benchmarks for each pipeline stage and the end-to-end upload.
+
+    python -m benchmarks.run --lengths 1,10 --concurrency 1,4 --output benchmarks/results/latest.json
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json --threshold 0.2
+
+Media is synthetic (generated WAV for the audio stages, generated transcripts for summarize/map) and
+the LLM is the deterministic stub, so runs need no network or API keys. Result, LLM and embedding
+caches are disabled (--embedding-cache turns the last back on), and every upload sends different
+audio, so no call is served by an earlier one. Exits with status 1 when any case regresses past the
+threshold against the baseline.
+"""
+import os
+import tempfile
+
+_WORK_DIR = tempfile.mkdtemp(prefix="bench-")
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("LLM_CACHE_TTL", "0")
+os.environ.setdefault("RESULT_CACHE_MAX_AGE", "0")
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_WORK_DIR, "results"))
+os.environ.setdefault("EMBEDDING_CACHE_DIR", os.path.join(_WORK_DIR, "embeddings"))
+os.environ.setdefault("WARM_UP_MODELS", "0")
+
+import argparse
+import asyncio
+import itertools
+import logging
+import platform
+import shutil
+import sys
+import time
+
+from benchmarks.report import RSSSampler, compare, load, save, summarize
+from benchmarks.synthetic import synthetic_key_points, synthetic_transcript, write_wav
+from services import models, profiles, transcriber
+from services.audio import decode_file
+from services.llm import StubLLMClient, set_llm_client
+
+logger = logging.getLogger("benchmarks")
+
+STAGES = ("ingest", "transcribe", "summarize", "map", "upload")
+
+# Fresh synthetic text and audio for every call, so neither single-flight nor the embedding cache short-circuits it
+_seeds = itertools.count()
+
+
+async def run_case(call, concurrency: int, iterations: int, audio_seconds: float = None) -> dict:
+    """Run `iterations` calls of call(i), at most `concurrency` at once, under an RSS sampler."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception as e:
+                errors += 1
+                logger.warning(f"Call {i} failed: {str(e)}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    with RSSSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(iterations)))
+        wall = time.perf_counter() - start
+    return {**summarize(latencies, wall, errors, audio_seconds), "concurrency": concurrency, "peak_rss_mb": rss.peak_mb}
+
+
+async def measure_model_loads() -> dict:
+    start = time.perf_counter()
+    await transcriber.warm_up_workers()
+    whisper = time.perf_counter() - start
+    start = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, models.get_embedding_backend)
+    embedding = time.perf_counter() - start
+    return {"whisper_workers_seconds": round(whisper, 3), "embedding_model_seconds": round(embedding, 3)}
+
+
+async def benchmark(args) -> dict:
+    import routes.mapping
+    from routes.mapping import map_key_points
+    from routes.summarization import summarize_lines
+
+    set_llm_client(StubLLMClient(delay=args.llm_delay))
+    if not args.embedding_cache:
+        # Measure the model on every call; mapping looks encode_texts up at call time
+        routes.mapping.encode_texts = routes.mapping._encode_uncached
+    results = {
+        "created_at": time.time(),
+        "machine": {"python": platform.python_version(), "cpus": os.cpu_count(), "platform": platform.platform()},
+        "settings": {
+            "iterations": args.iterations,
+            "llm_delay": args.llm_delay,
+            "transcribe_workers": transcriber.TRANSCRIBE_WORKERS,
+            "whisper_model": models.WHISPER_MODEL_SIZE,
+            "whisper_batch_size": transcriber.WHISPER_BATCH_SIZE,
+            "profile": args.profile,
+            "sentence_batch_delay": models.SENTENCE_BATCH_DELAY,
+            "embedding_backend": models.EMBEDDING_BACKEND,
+            "embedding_cache": args.embedding_cache,
+        },
+        "model_load": await measure_model_loads(),
+        "cases": {},
+    }
+
+    client = None
+    if "upload" in args.stages:
+        import httpx
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+    try:
+        for minutes in args.lengths:
+            seconds = minutes * 60
+            wav_path = os.path.join(_WORK_DIR, f"{minutes}m.wav")
+            if {"ingest", "transcribe", "upload"} & set(args.stages):
+                write_wav(wav_path, seconds)
+            audio = None
+            if "transcribe" in args.stages:
+                audio = await decode_file(wav_path)
+                await audio.wait_finished()
+
+            for concurrency in args.concurrency:
+                cases = {}
+                iterations = max(args.iterations, concurrency)
+                if "ingest" in args.stages:
+                    async def ingest(i):
+                        buffer = await decode_file(wav_path)
+                        try:
+                            await buffer.wait_finished()
+                        finally:
+                            buffer.close()
+                    cases["ingest"] = (ingest, seconds)
+                if "transcribe" in args.stages:
+                    async def transcribe(i):
+                        await transcriber.collect_transcription(audio, profile=profiles.resolve_profile(args.profile, seconds))
+                    cases["transcribe"] = (transcribe, seconds)
+                if "summarize" in args.stages:
+                    async def summarize_stage(i):
+                        await summarize_lines(synthetic_transcript(seconds, seed=next(_seeds)).lines(), duration=seconds)
+                    cases["summarize"] = (summarize_stage, None)
+                if "map" in args.stages:
+                    async def map_stage(i):
+                        transcript = synthetic_transcript(seconds, seed=next(_seeds))
+                        await map_key_points(transcript, synthetic_key_points(transcript, seed=i))
+                    cases["map"] = (map_stage, None)
+                upload_paths = []
+                if "upload" in args.stages:
+                    # Different audio per call (written before timing starts), so uploads share no file hash,
+                    # transcript or prompt with each other or with earlier cases
+                    upload_paths = [os.path.join(_WORK_DIR, f"{minutes}m-upload{i}.wav") for i in range(iterations)]
+                    for path in upload_paths:
+                        write_wav(path, seconds, seed=next(_seeds))
+
+                    async def upload(i):
+                        with open(upload_paths[i], "rb") as f:
+                            response = await client.post(
+                                "/api/upload", files={"file": (f"{minutes}m.wav", f, "audio/wav")}, data={"profile": args.profile}
+                            )
+                        response.raise_for_status()
+                    cases["upload"] = (upload, seconds)
+
+                for stage, (call, audio_seconds) in cases.items():
+                    name = f"{stage}/{minutes}m/c{concurrency}"
+                    logger.info(f"Running {name}")
+                    results["cases"][name] = await run_case(call, concurrency, iterations, audio_seconds)
+                    logger.info(f"{name}: {results['cases'][name]}")
+                for path in upload_paths:
+                    os.remove(path)
+
+            if audio is not None:
+                audio.close()
+    finally:
+        if client is not None:
+            await client.aclose()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", default="1,10,60", help="Media lengths in minutes, comma separated")
+    parser.add_argument("--concurrency", default="1,4", help="Concurrency levels, comma separated")
+    parser.add_argument("--iterations", type=int, default=3, help="Calls per case (at least the concurrency)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Subset of {','.join(STAGES)}")
+    parser.add_argument("--profile", default=profiles.TRANSCRIBE_PROFILE, choices=profiles.PROFILE_NAMES)
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="Seconds the stub LLM sleeps per call")
+    parser.add_argument("--embedding-cache", action="store_true", help="Encode through the shared embedding cache")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "latest.json"))
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression, e.g. 0.2 for 20%%")
+    parser.add_argument("--save-baseline", help="Also write the results here, to compare later runs against")
+    args = parser.parse_args(argv)
+    args.lengths = [float(value) if "." in value else int(value) for value in args.lengths.split(",")]
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+    args.stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    try:
+        results = asyncio.run(benchmark(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+    save(args.output, results)
+    logger.info(f"Wrote {len(results['cases'])} cases to {args.output}")
+    if args.save_baseline:
+        save(args.save_baseline, results)
+
+    if args.baseline:
+        regressions = compare(results, load(args.baseline), args.threshold)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
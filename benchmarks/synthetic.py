@@ -0,0 +1,62 @@
+import random
+import wave
+
+import numpy as np
+
+from services.chunking import SAMPLE_RATE
+from services.transcript import Transcript, seconds_to_hhmmss
+
+WORDS = (
+    "model data video insight pipeline latency audio speech summary point timestamp cache queue "
+    "worker chunk segment energy silence quality throughput memory request response budget key"
+).split()
+
+
+def write_wav(path: str, seconds: float, seed: int = 0):
+    """Write speech-like 16 kHz mono audio: harmonic bursts of 1-4 s separated by short pauses."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        written = 0
+        while written < total:
+            burst = int(rng.uniform(1.0, 4.0) * SAMPLE_RATE)
+            pause = int(rng.uniform(0.2, 1.0) * SAMPLE_RATE)
+            t = np.arange(burst) / SAMPLE_RATE
+            pitch = rng.uniform(90, 250)
+            voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+            envelope = np.abs(np.sin(2 * np.pi * rng.uniform(2, 6) * t))
+            signal = np.concatenate([0.3 * voice * envelope, np.zeros(pause)])
+            signal += rng.normal(0, 0.005, len(signal))
+            chunk = (np.clip(signal, -1, 1) * 32767).astype(np.int16)[:total - written]
+            out.writeframes(chunk.tobytes())
+            written += len(chunk)
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_transcript(seconds: float, seed: int = 0) -> Transcript:
+    """One segment every 3-6 seconds, as Whisper produces for ordinary speech."""
+    rng = random.Random(seed)
+    starts, ends, texts = [], [], []
+    start = 0.0
+    while start < seconds:
+        length = rng.uniform(3.0, 6.0)
+        starts.append(start)
+        ends.append(min(seconds, start + length))
+        texts.append(sentence(rng, rng.randint(6, 16)))
+        start += length
+    return Transcript(starts, ends, texts)
+
+
+def synthetic_key_points(transcript: Transcript, every: int = 25, seed: int = 0) -> list:
+    """Paraphrase-free key points drawn from every `every`-th segment, timestamped a little off."""
+    rng = random.Random(seed)
+    return [
+        {"timestamp": seconds_to_hhmmss(max(0.0, transcript.starts[i] + rng.uniform(-5, 5))), "text": transcript.texts[i]}
+        for i in range(0, len(transcript), every)
+    ]
@@ -1,16 +1,37 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 import uvicorn
 import os
+import time
+import asyncio
 import logging
+import secrets
+import shutil
+from services.logging_setup import setup_logging
+from services import inference, metrics, transcriber
+from services.models import get_embedding_backend, is_loaded
+from services.admission import admission
+from services.llm import llm_metrics
+from services.llm_cache import stats as llm_cache_stats
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Load models in the background after startup instead of on the first request
+WARM_UP_MODELS = os.getenv("WARM_UP_MODELS", "1") == "1"
+
+# HTTP worker processes; above 1 the models move into a shared inference service (services/inference.py)
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 1))
+# Pause between attempts to reach the inference service when it is not ready within its connect timeout
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", 10))
+
+# Requests sent with "X-Profile: 1" get a Server-Timing header with their per-stage durations
+PROFILE_HEADER = "x-profile"
+
 app = FastAPI()
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], expose_headers=["Server-Timing"])
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 try:
@@ -19,15 +40,60 @@ try:
     from routes.mapping import router as mapping_router
     from routes.upload import router as upload_router
     from routes.plaintext_summarization import router as plaintext_summarization_router
+    from routes.jobs import router as jobs_router
+    from routes.batch import router as batch_router
 
     app.include_router(upload_router, prefix="/api", tags=["Upload"])
+    app.include_router(batch_router, prefix="/api", tags=["Upload"])
     app.include_router(transcription_router, prefix="/api", tags=["Transcription"])
     app.include_router(summarization_router, prefix="/api", tags=["Summarization"])
     app.include_router(mapping_router, prefix="/api", tags=["Mapping"])
     app.include_router(plaintext_summarization_router, prefix="/api", tags=["Plaintext Summarization"])
+    app.include_router(jobs_router, prefix="/api", tags=["Jobs"])
 except Exception as e:
     logger.error(f"Failed to load routes: {str(e)}")
 
+async def warm_up_models():
+    while True:
+        try:
+            # Start the pool workers before this process loads torch, so they do not inherit it
+            await transcriber.warm_up_workers()
+            if not inference.remote_enabled():
+                await asyncio.get_running_loop().run_in_executor(None, get_embedding_backend)
+            logger.info("Model warm-up complete")
+            return
+        except Exception as e:
+            if not inference.remote_enabled():
+                logger.error(f"Model warm-up failed: {str(e)}")
+                return
+            # The service may still be loading or restarting; keep polling so /ready can recover
+            logger.warning(f"Inference service not ready, retrying in {WARM_UP_RETRY_SECONDS} seconds: {str(e)}")
+            await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+
+@app.on_event("startup")
+async def start_warm_up():
+    if WARM_UP_MODELS:
+        app.state.warm_up_task = asyncio.create_task(warm_up_models())
+
+def readiness():
+    if inference.remote_enabled():
+        # warm_up_workers only returns once the service has both models loaded
+        return {"inference_service": inference.service_ready}
+    return {
+        "transcription_workers": transcriber.workers_ready,
+        "embedding_model": is_loaded("embedding:"),
+    }
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if request.headers.get(PROFILE_HEADER) != "1":
+        return await call_next(request)
+    timings = metrics.start_profile()
+    start = time.perf_counter()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = metrics.server_timing(timings, time.perf_counter() - start)
+    return response
+
 @app.get("/")
 async def root():
     return FileResponse("static/index.html")  # Serve index.html at root
@@ -35,9 +101,36 @@ async def root():
 @app.get("/health")
 async def health():
     logger.info("Health check hit")
-    return {"status": "healthy"}
+    checks = readiness()
+    return {"status": "healthy", "ready": all(checks.values()), "models": checks, "queue": admission.snapshot(), "llm_keys": llm_metrics(), "llm_cache": llm_cache_stats}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    checks = readiness()
+    if not all(checks.values()):
+        return JSONResponse(status_code=503, content={"status": "warming_up", "models": checks})
+    return {"status": "ready", "models": checks}
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8080))
-    logger.info(f"Starting on port {port}")
-    uvicorn.run("main:app", host="0.0.0.0", port=port, log_level="info", workers=1, timeout_keep_alive=600)
\ No newline at end of file
+    service = None
+    if WEB_WORKERS > 1 and not inference.remote_enabled():
+        # Workers are spawned fresh and read these from the environment
+        address = inference.default_address()
+        authkey = secrets.token_hex(16)
+        os.environ["INFERENCE_ADDRESS"] = address
+        os.environ["INFERENCE_AUTHKEY"] = authkey
+        service = inference.start_service(address, authkey.encode())
+        logger.info(f"Started inference service (pid {service.pid}) on {address}")
+    logger.info(f"Starting {WEB_WORKERS} worker(s) on port {port}")
+    try:
+        uvicorn.run("main:app", host="0.0.0.0", port=port, log_level="info", workers=WEB_WORKERS, timeout_keep_alive=600)
+    finally:
+        if service is not None:
+            service.terminate()
+            service.join()
+            shutil.rmtree(os.path.dirname(os.environ["INFERENCE_ADDRESS"]), ignore_errors=True)
\ No newline at end of file
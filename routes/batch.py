@@ -0,0 +1,184 @@
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi.responses import StreamingResponse
+from typing import List
+import asyncio
+import json
+import logging
+import os
+import time
+import yt_dlp
+from routes.upload import (
+    hash_file, map_transcript, resolve_youtube, summarize_transcript, transcribe_youtube,
+    process_local_video, validate_youtube_url
+)
+from services.admission import admission, STAGE_CONCURRENCY
+from services.audio import decode_fd, probe_duration
+from services.pipeline import run_staged
+from services.profiles import validate_profile
+from services.result_cache import get_stage, put_stage, media_cache_key, youtube_cache_key, find_cache_key, settle_cache_key
+from services.transcript import Transcript
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 50))
+# Items allowed to wait between two stages; small, so a slow stage throttles the ones before it
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", 2))
+
+@router.post("/upload/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(None),
+    youtube_urls: List[str] = Form(None),
+    playlist_url: str = Form(None),
+    profile: str = Form(None)
+):
+    """Process many files and/or YouTube URLs (or a playlist) as one pipelined batch.
+
+    Streams NDJSON: one line per item as soon as it finishes (in completion order, with its
+    "index" in the request), then a summary line.
+    """
+    profile = validate_profile(profile)
+    urls = [url.strip() for url in youtube_urls or [] if url.strip()]
+    for url in urls:
+        validate_youtube_url(url)
+    if playlist_url:
+        validate_youtube_url(playlist_url)
+        async with admission.stage("download"):
+            urls += await asyncio.to_thread(expand_playlist, playlist_url, BATCH_MAX_ITEMS)
+    files = [file for file in files or [] if file.filename]
+    if not files and not urls:
+        raise HTTPException(status_code=400, detail="Provide files, YouTube URLs or a playlist URL")
+    if len(files) + len(urls) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+    # The first item's slot; the rest reserve theirs as they enter the pipeline, and each is released
+    # as soon as its item finishes, so a batch never holds more pipelines than it has in flight
+    release = admission.reserve()
+    items = []
+    try:
+        for file in files:
+            # The uploads close with the request; a duplicate descriptor keeps each spool file readable until its turn
+            fd = os.dup(await asyncio.to_thread(file.file.fileno))
+            items.append({"index": len(items), "source": file.filename, "fd": fd, "profile": profile})
+    except Exception:
+        release()
+        _close_items(items)
+        raise
+    items += [{"index": len(items) + i, "source": url, "youtube_url": url, "profile": profile} for i, url in enumerate(urls)]
+    items[0]["release"] = release
+    logger.info(f"Starting batch of {len(items)} items ({len(files)} files, {len(urls)} URLs)")
+
+    stages = [
+        ("ingest", STAGE_CONCURRENCY["download"], ingest_item),
+        ("transcribe", STAGE_CONCURRENCY["transcribe"], transcribe_item),
+        ("summarize", STAGE_CONCURRENCY["summarize"], summarize_item),
+        ("map", STAGE_CONCURRENCY["map"], map_item),
+    ]
+
+    async def results():
+        start = time.time()
+        counts = {"completed": 0, "failed": 0}
+        try:
+            async for item in run_staged(items, stages, BATCH_QUEUE_SIZE):
+                _close_item(item)
+                _release_item(item)
+                if item.get("error") is not None:
+                    counts["failed"] += 1
+                    line = {"index": item["index"], "source": item["source"], "status": "failed", "error": item["error"]}
+                else:
+                    counts["completed"] += 1
+                    line = {"index": item["index"], "source": item["source"], "status": "completed",
+                            "profile": profile, "mapped_data": item["result"]}
+                yield json.dumps(line) + "\n"
+            yield json.dumps({"status": "finished", "items": len(items), **counts,
+                              "seconds": round(time.time() - start, 2)}) + "\n"
+        except Exception as e:
+            logger.error(f"Batch failed: {str(e)}")
+            yield json.dumps({"status": "error", "error": f"Batch failed: {str(e)}"}) + "\n"
+        finally:
+            _close_items(items)
+            for item in items:
+                _release_item(item)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def expand_playlist(playlist_url: str, limit: int) -> list:
+    """Video URLs of a playlist (at most `limit`), listed without resolving each video."""
+    options = {"quiet": True, "extract_flat": "in_playlist", "playlistend": limit}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+    entries = [entry for entry in info.get("entries") or [] if entry and entry.get("id")]
+    logger.info(f"Playlist {playlist_url} has {len(entries)} videos")
+    return [f"https://www.youtube.com/watch?v={entry['id']}" for entry in entries]
+
+async def ingest_item(item: dict):
+    """Network/disk stage: find cached results, resolve YouTube streams or captions, start decoding files."""
+    if "release" not in item:
+        item["release"] = await admission.reserve_when_free()
+    if item.get("youtube_url"):
+        item["cache_key"] = youtube_cache_key(item["youtube_url"], item["profile"])
+    else:
+        fd = item["fd"]
+        item["cache_key"] = media_cache_key(await asyncio.to_thread(_hash_fd, fd), item["profile"])
+    item["cache_key"] = find_cache_key(item["cache_key"])
+
+    cached_mapped_data = get_stage(item["cache_key"], "mapped_data")
+    if cached_mapped_data is not None:
+        item["result"] = cached_mapped_data
+        return
+    cached_transcript = get_stage(item["cache_key"], "transcript")
+    if cached_transcript is not None:
+        item["transcript"] = Transcript.from_dict(cached_transcript["transcript"])
+        item["duration"] = cached_transcript["duration"]
+        return
+
+    if item.get("youtube_url"):
+        item["resolved"] = await resolve_youtube(item["youtube_url"], item["profile"])
+    else:
+        item["audio"] = await decode_fd(item["fd"], item["source"])
+        if item["profile"] == "auto":
+            item["audio"].expected_duration = await probe_duration(f"/dev/fd/{item['fd']}", pass_fds=(item["fd"],))
+
+async def transcribe_item(item: dict):
+    if "transcript" in item:
+        return
+    try:
+        if item.get("youtube_url"):
+            transcription = await transcribe_youtube(item["youtube_url"], item["resolved"], profile=item["profile"])
+        else:
+            transcription = await process_local_video(item["audio"], profile=item["profile"])
+    finally:
+        _close_item(item)
+    item["transcript"] = transcription["transcription"]
+    item["duration"] = transcription["duration"]
+    item["cache_key"] = settle_cache_key(item["cache_key"], transcription.get("profile"))
+    put_stage(item["cache_key"], "transcript", {"transcript": item["transcript"].to_dict(), "duration": item["duration"]})
+
+async def summarize_item(item: dict):
+    item["key_points"] = await summarize_transcript(item["cache_key"], item["transcript"], item["duration"])
+
+async def map_item(item: dict):
+    item["result"] = await map_transcript(item["cache_key"], item["transcript"], item["key_points"], item["duration"])
+
+def _hash_fd(fd: int) -> str:
+    # A fresh open file description, so reading does not move the offset ffmpeg will use
+    with open(f"/dev/fd/{fd}", "rb") as f:
+        return hash_file(f)
+
+def _close_item(item: dict):
+    audio = item.pop("audio", None)
+    if audio is not None:
+        audio.close()
+    fd = item.pop("fd", None)
+    if fd is not None:
+        os.close(fd)
+
+def _release_item(item: dict):
+    release = item.pop("release", None)
+    if release is not None:
+        release()
+
+def _close_items(items: list):
+    for item in items:
+        _close_item(item)
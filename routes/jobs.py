@@ -0,0 +1,54 @@
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi.responses import StreamingResponse
+import json
+import logging
+from routes.upload import submit_upload_job
+from services.jobs import job_manager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(None),
+    youtube_url: str = Form(None),
+    profile: str = Form(None)
+):
+    if not file and not youtube_url:
+        raise HTTPException(status_code=400, detail="Provide either a file or a YouTube URL")
+
+    job = await submit_upload_job(file, youtube_url, profile)
+    return {"job_id": job.id, "status": job.status}
+
+async def get_job_or_404(job_id: str):
+    job = await job_manager.find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return (await get_job_or_404(job_id)).snapshot()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, since: int = 0):
+    job = await get_job_or_404(job_id)
+
+    async def event_source():
+        async for event in job.stream(since):
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await get_job_or_404(job_id)
+    if not await job_manager.request_cancel(job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    logger.info(f"Cancellation requested for job {job_id}")
+    return {"job_id": job_id, "status": "cancelling"}
@@ -1,21 +1,22 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
+import os
+import asyncio
 import logging
-from datetime import datetime
-from sentence_transformers import SentenceTransformer, util
+from services.models import get_embedding_backend, sentence_batcher
+from services import inference
+from services.embedding_cache import get_embedding_cache
+from services.admission import admission
+from services.transcript import Transcript, hhmmss_to_seconds, seconds_to_hhmmss
 import numpy as np
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    force=True
-)
-logging.getLogger("sentence_transformers").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-sentence_model = SentenceTransformer("paraphrase-MiniLM-L6-v2")
+
+# Optional candidate window around each key point's own timestamp; unset means every segment competes
+MAPPING_WINDOW_SECONDS = float(os.getenv("MAPPING_WINDOW_SECONDS")) if os.getenv("MAPPING_WINDOW_SECONDS") else None
 
 class TranscriptionItem(BaseModel):
     timestamp: str
@@ -29,13 +30,63 @@ class MappingRequest(BaseModel):
     transcription: List[TranscriptionItem]
     key_points: List[KeyPointItem]
 
-def hhmmss_to_seconds(hhmmss: str) -> float:
-    try:
-        time_obj = datetime.strptime(hhmmss, "%H:%M:%S")
-        return time_obj.hour * 3600 + time_obj.minute * 60 + time_obj.second
-    except ValueError:
-        logger.warning(f"Invalid timestamp: {hhmmss}")
-        return 0
+def _encode_uncached(texts: List[str]) -> np.ndarray:
+    if inference.remote_enabled():
+        return inference.encode_remote(texts)
+    return sentence_batcher.submit(texts)
+
+def _embedding_backend_name() -> str:
+    if inference.remote_enabled():
+        return inference.embedding_backend_remote()
+    return get_embedding_backend().name
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    # Only texts missing from the shared embedding cache reach the model
+    return get_embedding_cache(_embedding_backend_name()).encode(texts, _encode_uncached)
+
+def _combined_scores(
+    key_embeddings: np.ndarray,
+    key_seconds: np.ndarray,
+    trans_embeddings: np.ndarray,
+    trans_seconds: np.ndarray
+) -> np.ndarray:
+    similarities = key_embeddings @ trans_embeddings.T
+    time_diffs = np.abs(key_seconds[:, None] - trans_seconds[None, :])
+    time_similarities = np.maximum(0, 1 - (time_diffs / 60.0)) * 100
+    return 0.6 * similarities * 100 + 0.4 * time_similarities
+
+def score_key_points(
+    key_embeddings: np.ndarray,
+    key_seconds: np.ndarray,
+    trans_embeddings: np.ndarray,
+    trans_seconds: np.ndarray,
+    window_seconds: float = None
+):
+    """Score key points against segments; returns (best index, best score) per key point.
+
+    trans_seconds must be sorted. Without window_seconds every key point is scored against every
+    segment in one matrix product. With it, each key point is only scored against the segments
+    within that many seconds of its own timestamp; a key point with none scores -inf.
+    """
+    if window_seconds is None:
+        combined_scores = _combined_scores(key_embeddings, key_seconds, trans_embeddings, trans_seconds)
+        best_idx = np.argmax(combined_scores, axis=1)
+        return best_idx, combined_scores[np.arange(len(best_idx)), best_idx]
+
+    lo = np.searchsorted(trans_seconds, key_seconds - window_seconds, side="left")
+    hi = np.searchsorted(trans_seconds, key_seconds + window_seconds, side="right")
+    best_idx = np.zeros(len(key_seconds), dtype=np.int64)
+    best_scores = np.full(len(key_seconds), -np.inf)
+    for k, (start, stop) in enumerate(zip(lo.tolist(), hi.tolist())):
+        if start == stop:
+            continue
+        scores = _combined_scores(
+            key_embeddings[k:k + 1], key_seconds[k:k + 1], trans_embeddings[start:stop], trans_seconds[start:stop]
+        )[0]
+        best = int(np.argmax(scores))
+        best_idx[k] = start + best
+        best_scores[k] = scores[best]
+    return best_idx, best_scores
 
 @router.post("/mapping")
 async def map_timestamps(request: MappingRequest):
@@ -44,39 +95,44 @@ async def map_timestamps(request: MappingRequest):
         logger.error("Transcription or key points empty")
         raise HTTPException(status_code=400, detail="Transcription or key points empty")
 
-    try:
-        transcription_with_seconds = sorted(
-            [
-                {"timestamp": entry.timestamp, "text": entry.text.strip(), "seconds": hhmmss_to_seconds(entry.timestamp)}
-                for entry in request.transcription
-            ],
-            key=lambda x: x["seconds"]
-        )
-
-        trans_texts = [entry["text"] for entry in transcription_with_seconds]
-        trans_embeddings = sentence_model.encode(trans_texts, convert_to_tensor=True)
-
-        mapped_data = []
-        for key_point in request.key_points:
-            key_point_seconds = hhmmss_to_seconds(key_point.timestamp)
-            key_embedding = sentence_model.encode([key_point.text], convert_to_tensor=True)
-
-            similarities = util.cos_sim(key_embedding, trans_embeddings)[0].numpy()
-            time_diffs = np.array([abs(entry["seconds"] - key_point_seconds) for entry in transcription_with_seconds])
-            time_similarities = np.maximum(0, 1 - (time_diffs / 60.0)) * 100
-            combined_scores = 0.6 * similarities * 100 + 0.4 * time_similarities
-
-            best_idx = np.argmax(combined_scores)
-            best_score = combined_scores[best_idx]
-
-            if best_score > 50:
-                best_match = transcription_with_seconds[best_idx]
-                mapped_data.append({"timestamp": best_match["timestamp"], "text": key_point.text})
-            else:
-                mapped_data.append({"timestamp": key_point.timestamp, "text": key_point.text, "note": "No close match"})
-
-        logger.info(f"Mapped {len(mapped_data)} key points")
-        return {"mapped_data": mapped_data}
-    except Exception as e:
-        logger.error(f"Mapping failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Mapping failed: {str(e)}")
\ No newline at end of file
+    key_points = [{"timestamp": key_point.timestamp, "text": key_point.text} for key_point in request.key_points]
+    mapped = await map_key_points(Transcript.from_items(request.transcription), key_points)
+    return {"mapped_data": format_mapped(mapped)}
+
+async def map_key_points(transcript: Transcript, key_points: list) -> list:
+    """Match {"timestamp", "text"} key points to segments; returns {"seconds", "text"[, "note"]} in input order."""
+    async with admission.stage("map"):
+        try:
+            transcript = transcript.sorted()
+            trans_seconds = transcript.starts
+
+            key_texts = [key_point["text"] for key_point in key_points]
+            key_seconds = np.array([hhmmss_to_seconds(key_point["timestamp"]) for key_point in key_points], dtype=np.float64)
+
+            # One forward pass for segments and key points together, off the event loop
+            embeddings = await asyncio.get_running_loop().run_in_executor(None, encode_texts, transcript.texts + key_texts)
+            trans_embeddings, key_embeddings = embeddings[:len(transcript)], embeddings[len(transcript):]
+
+            best_idx, best_scores = score_key_points(
+                key_embeddings, key_seconds, trans_embeddings, trans_seconds, MAPPING_WINDOW_SECONDS
+            )
+
+            mapped_data = []
+            for text, seconds, idx, score in zip(key_texts, key_seconds.tolist(), best_idx, best_scores):
+                if score > 50:
+                    mapped_data.append({"seconds": float(trans_seconds[idx]), "text": text})
+                else:
+                    mapped_data.append({"seconds": seconds, "text": text, "note": "No close match"})
+
+            logger.info(f"Mapped {len(mapped_data)} key points")
+            return mapped_data
+        except Exception as e:
+            logger.error(f"Mapping failed: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Mapping failed: {str(e)}")
+
+def format_mapped(mapped_data: list) -> list:
+    """Response shape of map_key_points output: seconds become an HH:MM:SS timestamp."""
+    return [
+        {"timestamp": seconds_to_hhmmss(point["seconds"]), **{k: v for k, v in point.items() if k != "seconds"}}
+        for point in mapped_data
+    ]
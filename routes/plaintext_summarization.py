@@ -1,39 +1,21 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import google.generativeai as genai
-import os
 from dotenv import load_dotenv
 import logging
+from services.admission import admission
+from services.llm import LLM_BACKEND, load_api_keys
+from services.llm_cache import generate_cached
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    force=True
-)
-logging.getLogger("google.generativeai").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 router = APIRouter()
 
-API_KEYS = [
-    os.getenv("GOOGLE_API_KEY_1"),
-    os.getenv("GOOGLE_API_KEY_2"),
-    os.getenv("GOOGLE_API_KEY_3"),
-    os.getenv("GOOGLE_API_KEY_4"),
-]
-if not all(API_KEYS):
-    logger.error("One or more GOOGLE_API_KEYs not set")
-    raise RuntimeError("GOOGLE_API_KEYs missing in environment variables")
+if LLM_BACKEND == "gemini":
+    load_api_keys()
 
-current_key_index = 0
-
-def configure_genai():
-    global current_key_index
-    genai.configure(api_key=API_KEYS[current_key_index])
-    logger.info(f"Using API key at index {current_key_index}")
-
-configure_genai()
+# Part of the response cache key; bump when the prompt changes
+PLAINTEXT_PROMPT_VERSION = "plaintext/1"
 
 class TranscriptionItem(BaseModel):
     timestamp: str
@@ -58,27 +40,13 @@ async def plaintext_summarize_text(request: TranscriptionRequest):
     {full_text}
     """
 
-    global current_key_index
-    max_attempts = len(API_KEYS)
-    for attempt in range(max_attempts):
+    async with admission.stage("summarize"):
         try:
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            if not response or not response.text:
-                logger.error("Empty summary response from Gemini")
-                raise HTTPException(status_code=500, detail="Empty summary response")
-            
-            summary = response.text.strip()
+            summary = (await generate_cached(prompt, PLAINTEXT_PROMPT_VERSION)).strip()
             logger.info(f"Plaintext summary generated")
             return {"summary": summary}
+        except HTTPException:
+            raise
         except Exception as e:
-            if "429" in str(e):
-                logger.warning(f"Rate limit hit for key {current_key_index}: {str(e)}")
-                current_key_index = (current_key_index + 1) % len(API_KEYS)
-                configure_genai()
-                if attempt == max_attempts - 1:
-                    logger.error("All API keys exhausted")
-                    raise HTTPException(status_code=429, detail="All API keys exhausted")
-            else:
-                logger.error(f"Plaintext summarization failed: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Plaintext summarization failed: {str(e)}")
\ No newline at end of file
+            logger.error(f"Plaintext summarization failed: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Plaintext summarization failed: {str(e)}")
\ No newline at end of file
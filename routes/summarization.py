@@ -1,42 +1,30 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
 import re
+import asyncio
 import logging
+from dotenv import load_dotenv
+from services.admission import admission
+from services.llm import LLM_BACKEND, estimate_tokens, load_api_keys
+from services.llm_cache import generate_cached
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    force=True
-)
-logging.getLogger("google.generativeai").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 router = APIRouter()
 
-# Load all API keys
-API_KEYS = [
-    os.getenv("GOOGLE_API_KEY_1"),
-    os.getenv("GOOGLE_API_KEY_2"),
-    os.getenv("GOOGLE_API_KEY_3"),
-    os.getenv("GOOGLE_API_KEY_4"),
-]
-if not all(API_KEYS):
-    logger.error("One or more GOOGLE_API_KEYs not set")
-    raise RuntimeError("GOOGLE_API_KEYs missing in environment variables")
+# Transcripts estimated above this many tokens are summarized map-reduce style
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 8000))
+# Chunk summaries in flight at once for one transcript
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 4))
 
-# Global state for key rotation
-current_key_index = 0
+if LLM_BACKEND == "gemini":
+    load_api_keys()  # Fail at startup, as before, when keys are missing
 
-def configure_genai():
-    global current_key_index
-    genai.configure(api_key=API_KEYS[current_key_index])
-    logger.info(f"Using API key at index {current_key_index}")
-
-configure_genai()  # Initial config
+# Part of the response cache key; bump when a prompt or parse_key_points changes
+KEY_POINTS_PROMPT_VERSION = "key_points/1"
+REDUCE_PROMPT_VERSION = "reduce/1"
 
 class TranscriptionItem(BaseModel):
     timestamp: str
@@ -45,22 +33,14 @@ class TranscriptionItem(BaseModel):
 class TranscriptionRequest(BaseModel):
     transcription: list[TranscriptionItem]
 
-@router.post("/summarize")
-async def summarize_text(request: TranscriptionRequest, duration: float = None):
-    logger.info(f"Starting summarization for {len(request.transcription)} segments")
-    if not request.transcription:
-        logger.error("Transcription list is empty")
-        raise HTTPException(status_code=400, detail="Transcription list is empty")
-
-    formatted_text = "\n".join(f"{entry.timestamp} {entry.text}" for entry in request.transcription)
-    prompt = f"""
+KEY_POINTS_PROMPT = """
     Extract the most impactful and meaningful key insights from the following transcription, focusing on ideas that capture the core essence and primary value of the content.
     Each insight must be a complete, concise sentence (maximum one sentence per point) that carries significant weight and resonates with the video’s main narrative.
     Be selective—include only insights that are critical to the content’s purpose, excluding minor details or redundant ideas, but ensure enough points to comprehensively represent the video’s key messages.
     Distribute insights across the entire duration of the video to capture key moments from beginning to end, ensuring a balanced representation of the content.
     The number of insights should reflect the content’s richness and duration (e.g., roughly 3-4 insights for sparse content per 10 minutes, up to 5-7 for dense content per 10 minutes), prioritizing quality to ensure a curated, trustworthy output.
     Include the corresponding timestamp in HH:MM:SS format.
-    
+    {scope}
     Format:
     HH:MM:SS <Complete sentence describing a high-impact, meaningful insight.>
 
@@ -68,31 +48,119 @@ async def summarize_text(request: TranscriptionRequest, duration: float = None):
     {formatted_text}
     """
 
-    global current_key_index
-    max_attempts = len(API_KEYS)
-    for attempt in range(max_attempts):
+REDUCE_PROMPT = """
+    The following candidate insights were extracted from consecutive parts of one video, each with the timestamp where it occurs.
+    Merge them into the final list of key insights for the whole video: drop duplicates and near-duplicates, combine points that state the same idea, and keep only insights that are critical to the content’s purpose.
+    Keep insights spread across the entire duration, aiming for roughly {target} insights.
+    Each insight must be one complete, concise sentence. Keep each insight’s original timestamp exactly as given, in HH:MM:SS format.
+
+    Format:
+    HH:MM:SS <Complete sentence describing a high-impact, meaningful insight.>
+
+    Candidate insights:
+    {candidates}
+    """
+
+def parse_key_points(text: str) -> list:
+    return [
+        {"timestamp": match.group(1), "text": match.group(2)}
+        for line in text.strip().split("\n") if (match := re.match(r"(\d{2}:\d{2}:\d{2})\s+(.+\.)", line.strip()))
+    ]
+
+def split_transcript(lines: list, token_budget: int) -> list:
+    """Group formatted "HH:MM:SS text" lines into time-contiguous chunks of at most token_budget tokens."""
+    chunks, current, current_tokens = [], [], 0
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _normalize_insight(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+def dedupe_key_points(key_points: list, threshold: float = 0.8) -> list:
+    """Sort by timestamp and drop points whose words mostly repeat an earlier point."""
+    kept, kept_words = [], []
+    for point in sorted(key_points, key=lambda p: p["timestamp"]):
+        words = _normalize_insight(point["text"])
+        if any(len(words & other) / max(1, len(words | other)) >= threshold for other in kept_words):
+            continue
+        kept.append(point)
+        kept_words.append(words)
+    return kept
+
+async def summarize_single(formatted_text: str) -> list:
+    prompt = KEY_POINTS_PROMPT.format(scope="", formatted_text=formatted_text)
+    return parse_key_points(await generate_cached(prompt, KEY_POINTS_PROMPT_VERSION))
+
+async def summarize_map_reduce(lines: list, duration: float = None) -> list:
+    chunks = split_transcript(lines, SUMMARY_CHUNK_TOKENS)
+    logger.info(f"Summarizing {len(lines)} segments as {len(chunks)} chunks")
+    semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+
+    async def summarize_chunk(index: int, chunk: list) -> list:
+        scope = (
+            f"This is part {index + 1} of {len(chunks)} of the video, covering {chunk[0][:8]} to {chunk[-1][:8]}; "
+            "extract insights for this part only.\n"
+        )
+        async with semaphore:
+            prompt = KEY_POINTS_PROMPT.format(scope=scope, formatted_text="\n".join(chunk))
+            text = await generate_cached(prompt, KEY_POINTS_PROMPT_VERSION)
+        return parse_key_points(text)
+
+    partials = await asyncio.gather(*(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+    candidates = dedupe_key_points([point for points in partials for point in points])
+    if len(chunks) == 1 or not candidates:
+        return candidates
+
+    # Roughly five insights per ten minutes, as the single-pass prompt suggests
+    target = max(3, round(5 * duration / 600)) if duration else len(candidates)
+    prompt = REDUCE_PROMPT.format(
+        target=target,
+        candidates="\n".join(f"{point['timestamp']} {point['text']}" for point in candidates)
+    )
+    merged = parse_key_points(await generate_cached(prompt, REDUCE_PROMPT_VERSION))
+    if not merged:
+        logger.warning("Reduce step returned no parseable insights; using merged chunk insights")
+        return candidates
+    return dedupe_key_points(merged)
+
+@router.post("/summarize")
+async def summarize_text(request: TranscriptionRequest, duration: float = None, mode: str = "auto"):
+    """mode is "single", "map_reduce", or "auto" (map-reduce once the transcript exceeds SUMMARY_CHUNK_TOKENS)."""
+    logger.info(f"Starting summarization for {len(request.transcription)} segments")
+    return {"key_points": await summarize_lines(
+        [f"{entry.timestamp} {entry.text}" for entry in request.transcription], duration, mode
+    )}
+
+async def summarize_lines(lines: list, duration: float = None, mode: str = "auto") -> list:
+    """Key points for formatted "HH:MM:SS text" lines, e.g. from Transcript.lines()."""
+    if not lines:
+        logger.error("Transcription list is empty")
+        raise HTTPException(status_code=400, detail="Transcription list is empty")
+    if mode not in ("auto", "single", "map_reduce"):
+        raise HTTPException(status_code=400, detail=f"Unknown summarization mode: {mode}")
+
+    formatted_text = "\n".join(lines)
+    if mode == "auto":
+        mode = "map_reduce" if estimate_tokens(formatted_text) > SUMMARY_CHUNK_TOKENS else "single"
+
+    async with admission.stage("summarize"):
         try:
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            if not response or not response.text:
-                logger.error("Empty summary response from Gemini")
-                raise HTTPException(status_code=500, detail="Empty summary response")
-            
-            key_points = response.text.strip().split("\n")
-            cleaned_key_points = [
-                {"timestamp": match.group(1), "text": match.group(2)}
-                for line in key_points if (match := re.match(r"(\d{2}:\d{2}:\d{2})\s+(.+\.)", line))
-            ]
-            logger.info(f"Generated {len(cleaned_key_points)} key points with key {current_key_index}")
-            return {"key_points": cleaned_key_points}
-        except Exception as e:
-            if "429" in str(e):  # Rate limit error
-                logger.warning(f"Rate limit hit for key {current_key_index}: {str(e)}")
-                current_key_index = (current_key_index + 1) % len(API_KEYS)
-                configure_genai()
-                if attempt == max_attempts - 1:
-                    logger.error("All API keys exhausted")
-                    raise HTTPException(status_code=429, detail="All API keys exhausted")
+            if mode == "map_reduce":
+                cleaned_key_points = await summarize_map_reduce(lines, duration)
             else:
-                logger.error(f"Summarization failed: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
\ No newline at end of file
+                cleaned_key_points = await summarize_single(formatted_text)
+            logger.info(f"Generated {len(cleaned_key_points)} key points ({mode})")
+            return cleaned_key_points
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Summarization failed: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
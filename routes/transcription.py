@@ -1,29 +1,58 @@
 from fastapi import APIRouter, HTTPException
-from faster_whisper import WhisperModel
+from fastapi.responses import StreamingResponse
+from services.transcriber import collect_transcription, stream_transcription
+from services.admission import admission, Overloaded
+from services.transcript import format_segment
+from services.audio import decode_file, probe_duration
+from services.profiles import resolve_profile, validate_profile
 import os
+import json
 import logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-model = WhisperModel("tiny.en", device="cpu", compute_type="int8")
-
-def seconds_to_hhmmss(seconds: float) -> str:
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
 @router.post("/transcription")
-async def transcribe(video_path: str):
+async def transcribe(video_path: str, stream: bool = False, profile: str = None):
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video file not found")
+    profile = validate_profile(profile)
+    duration = await probe_duration(video_path) if profile == "auto" else None
+
+    if stream:
+        # Fail fast with a 503 while the response can still carry a status code
+        admission.stages["transcribe"].check()
+
+        async def segments():
+            audio = None
+            try:
+                async with admission.stage("transcribe"):
+                    audio = await decode_file(video_path)
+                    async for segment in stream_transcription(audio, resolve_profile(profile, duration)):
+                        yield json.dumps(format_segment(segment)) + "\n"
+            except Exception as e:
+                # Headers are already sent, so report the failure in-band
+                logger.error(f"Streaming transcription failed: {str(e)}")
+                yield json.dumps({"error": f"Transcription failed: {str(e)}"}) + "\n"
+            finally:
+                if audio is not None:
+                    audio.close()
+
+        return StreamingResponse(segments(), media_type="application/x-ndjson")
+
+    audio = None
     try:
-        segments, _ = model.transcribe(video_path, language="en")
-        transcription = [{"timestamp": seconds_to_hhmmss(segment.start), "text": segment.text.strip()} for segment in segments]
+        async with admission.stage("transcribe"):
+            audio = await decode_file(video_path)
+            transcription = await collect_transcription(audio, profile=resolve_profile(profile, duration))
         logger.info(f"Transcription completed with {len(transcription)} segments")
-        return {"transcription": transcription}
+        return {"transcription": transcription.to_items(), "profile": profile}
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Transcription failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    finally:
+        if audio is not None:
+            audio.close()
@@ -1,199 +1,336 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form, BackgroundTasks
-import os
-import tempfile
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi.responses import StreamingResponse
+import json
 import logging
 import yt_dlp
-from faster_whisper import WhisperModel
-from routes.summarization import summarize_text, TranscriptionRequest
-from routes.mapping import map_timestamps, MappingRequest
-import ffmpeg
+from functools import partial
+from routes.summarization import summarize_lines
+from routes.mapping import map_key_points, format_mapped
+from services.result_cache import (
+    get_stage, put_stage, media_cache_key, youtube_cache_key, find_cache_key, settle_cache_key
+)
+from services.transcriber import collect_transcription
+from services.jobs import job_manager
+from services.admission import admission, Overloaded
+from services.transcript import Transcript, TranscriptBuilder, format_segment
+from services.audio import PCMBuffer, decode_upload, decode_url, probe_upload
+from services.profiles import TRANSCRIBE_PROFILE, resolve_profile, validate_profile
+from services.captions import YOUTUBE_CAPTIONS, fetch_captions
+from services.metrics import observe_stage
 import time
-from datetime import datetime
-import torch
 import asyncio
-from concurrent.futures import ProcessPoolExecutor
+import hashlib
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    force=True
-)
-# Suppress DEBUG logs from other libraries
-logging.getLogger("faster_whisper").setLevel(logging.WARNING)
-logging.getLogger("sentence_transformers").setLevel(logging.WARNING)
-logging.getLogger("urllib3").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Optimized Whisper setup
-device = "cuda" if torch.cuda.is_available() else "cpu"
-compute_type = "float16" if device == "cuda" else "int8"
-model = WhisperModel("tiny.en", device=device, compute_type=compute_type, cpu_threads=os.cpu_count() // 2)
-logger.info(f"Whisper tiny.en model loaded on {device.upper()} using {compute_type}")
-
-# Process pool for CPU-bound tasks
-executor = ProcessPoolExecutor(max_workers=2)
-
-def seconds_to_hhmmss(seconds: float) -> str:
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-
-def hhmmss_to_seconds(hhmmss: str) -> int:
-    try:
-        t = datetime.strptime(hhmmss, "%H:%M:%S")
-        return t.hour * 3600 + t.minute * 60 + t.second
-    except ValueError:
-        logger.warning(f"Invalid timestamp format: {hhmmss}")
-        return 0
-
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(None),
     youtube_url: str = Form(None),
-    background_tasks: BackgroundTasks = None
+    stream: bool = Form(False),
+    profile: str = Form(None)
 ):
     if not file and not youtube_url:
         raise HTTPException(status_code=400, detail="Provide either a file or a YouTube URL")
+    profile = validate_profile(profile)
 
     logger.info(f"Starting upload processing: file={file.filename if file else None}, youtube_url={youtube_url}")
-    total_start = time.time()
 
+    if stream:
+        return await stream_upload(file, youtube_url, profile)
+
+    release = admission.reserve()
+    audio = None
     try:
-        start = time.time()
-        transcription_result = await (
-            process_local_video(file, background_tasks) if file else process_youtube_video(youtube_url)
+        if file:
+            cache_key, audio = await open_upload(file, profile)
+        else:
+            cache_key = youtube_cache_key(youtube_url, profile)
+
+        return await run_upload_pipeline(
+            file.filename if file else youtube_url, cache_key, audio=audio, youtube_url=youtube_url, profile=profile
+        )
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        release()
+        if audio is not None:
+            audio.close()
+
+async def submit_upload_job(file: UploadFile, youtube_url: str, profile: str = None):
+    profile = validate_profile(profile)
+    # Reject before spending any time on the upload; the slot is released when the job ends
+    release = admission.reserve()
+    if file:
+        # The upload closes with the request, so start decoding it before the job runs
+        try:
+            cache_key, audio = await open_upload(file, profile)
+        except Exception:
+            release()
+            raise
+        source = file.filename
+
+        def cleanup():
+            release()
+            if audio is not None:
+                audio.close()
+    else:
+        audio, cache_key = None, youtube_cache_key(youtube_url, profile)
+        source = youtube_url
+        cleanup = release
+
+    try:
+        return await job_manager.submit(
+            source,
+            partial(run_upload_pipeline, source, cache_key, audio=audio, youtube_url=youtube_url, profile=profile),
+            cleanup=cleanup
         )
-        logger.info(f"Transcription stage completed in {time.time() - start:.2f} seconds")
+    except BaseException:
+        # The job never started, e.g. the client went away while it was being registered
+        cleanup()
+        raise
+
+async def stream_upload(file: UploadFile, youtube_url: str, profile: str = None):
+    """Run the pipeline as a job and stream its events (including each transcript segment) as NDJSON."""
+    job = await submit_upload_job(file, youtube_url, profile)
+
+    async def events():
+        try:
+            async for event in job.stream():
+                yield json.dumps({"job_id": job.id, **event}) + "\n"
+        finally:
+            if not job.finished:
+                job_manager.cancel(job.id)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _no_report(stage: str, progress: int, **data):
+    pass
 
-        transcription_data = transcription_result["transcription"]
+async def run_upload_pipeline(
+    source: str,
+    cache_key: str,
+    audio: PCMBuffer = None,
+    youtube_url: str = None,
+    profile: str = None,
+    *,
+    report=_no_report
+):
+    """Transcribe, summarize and map one video, reporting (stage, percent) as it goes.
+
+    An upload comes in as `audio`, already decoding; a YouTube URL is decoded here. Either may be
+    omitted when the transcript is already cached. `profile` names the transcription profile.
+    """
+    total_start = time.time()
+    message = "YouTube video processed successfully" if youtube_url else "Local video processed successfully"
+
+    cache_key = find_cache_key(cache_key)
+    cached_mapped_data = get_stage(cache_key, "mapped_data")
+    if cached_mapped_data is not None:
+        logger.info(f"Served {source} from result cache in {time.time() - total_start:.2f} seconds")
+        report("completed", 100)
+        return {"message": message, "source": source, "profile": profile, "mapped_data": cached_mapped_data}
+
+    report("transcription", 5)
+    start = time.time()
+    cached_transcript = get_stage(cache_key, "transcript")
+    if cached_transcript is not None:
+        transcript = Transcript.from_dict(cached_transcript["transcript"])
+        duration = cached_transcript["duration"]
+    else:
+        def on_segment(segment, duration):
+            progress = 5 + int(50 * min(1.0, segment["start"] / duration)) if duration else 5
+            report("transcription", progress, segment=format_segment(segment))
+
+        transcription_result = await (
+            process_youtube_video(youtube_url, on_segment, profile) if youtube_url
+            else process_local_video(audio, on_segment, profile)
+        )
+        transcript = transcription_result["transcription"]
         duration = transcription_result["duration"]
+        cache_key = settle_cache_key(cache_key, transcription_result.get("profile"))
+        put_stage(cache_key, "transcript", {"transcript": transcript.to_dict(), "duration": duration})
+    logger.info(f"Transcription stage completed in {time.time() - start:.2f} seconds")
 
-        start = time.time()
-        summary_result = await summarize_text(TranscriptionRequest(transcription=transcription_data), duration=duration)
-        logger.info(f"Summarization completed in {time.time() - start:.2f} seconds")
-        key_points = summary_result["key_points"]
+    report("summarization", 60)
+    start = time.time()
+    key_points = await summarize_transcript(cache_key, transcript, duration)
+    logger.info(f"Summarization completed in {time.time() - start:.2f} seconds")
 
-        start = time.time()
-        mapping_result = await map_timestamps(MappingRequest(transcription=transcription_data, key_points=key_points))
-        logger.info(f"Mapping completed in {time.time() - start:.2f} seconds")
-        mapped_data = mapping_result["mapped_data"]
+    report("mapping", 85)
+    start = time.time()
+    sorted_data = await map_transcript(cache_key, transcript, key_points, duration)
+    logger.info(f"Mapping completed in {time.time() - start:.2f} seconds")
 
-        filtered_data = [
-            point for point in mapped_data if hhmmss_to_seconds(point["timestamp"]) <= duration
-        ]
-        sorted_data = sorted(filtered_data, key=lambda x: hhmmss_to_seconds(x["timestamp"]))
-        total_time = time.time() - total_start
-        logger.info(f"Total processing time: {total_time:.2f} seconds")
+    total_time = time.time() - total_start
+    observe_stage("pipeline", total_time)
+    logger.info(f"Total processing time: {total_time:.2f} seconds")
+    report("completed", 100)
 
-        return {
-            "message": transcription_result["message"],
-            "source": file.filename if file else youtube_url,
-            "mapped_data": sorted_data
-        }
+    return {
+        "message": message,
+        "source": source,
+        "profile": profile,
+        "mapped_data": sorted_data
+    }
 
-    except Exception as e:
-        logger.error(f"Upload failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+async def summarize_transcript(cache_key: str, transcript: Transcript, duration: float) -> list:
+    key_points = get_stage(cache_key, "key_points")
+    if key_points is None:
+        key_points = await summarize_lines(transcript.lines(), duration=duration)
+        put_stage(cache_key, "key_points", key_points)
+    return key_points
 
-async def process_local_video(file: UploadFile, background_tasks: BackgroundTasks):
-    logger.info(f"Processing local video: {file.filename}")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-        temp_path = temp_file.name
-        try:
-            while chunk := await file.read(1024 * 1024):
-                temp_file.write(chunk)
-            logger.info(f"Local file saved to {temp_path}")
+async def map_transcript(cache_key: str, transcript: Transcript, key_points: list, duration: float) -> list:
+    """Map key points onto the transcript and cache the final, time-ordered result."""
+    mapped_data = await map_key_points(transcript, key_points)
+    filtered_data = [point for point in mapped_data if point["seconds"] <= duration]
+    sorted_data = format_mapped(sorted(filtered_data, key=lambda point: point["seconds"]))
+    put_stage(cache_key, "mapped_data", sorted_data)
+    return sorted_data
 
-            duration = float(ffmpeg.probe(temp_path)['format']['duration'])
-            logger.info(f"Local video duration: {duration:.2f} seconds")
+async def open_upload(file: UploadFile, profile: str):
+    """Hash the spooled upload for the result cache, and start decoding it unless its transcript is cached."""
+    cache_key = media_cache_key(await asyncio.to_thread(hash_file, file.file), profile)
+    if get_stage(find_cache_key(cache_key), "transcript") is not None:
+        return cache_key, None
+    logger.info(f"Decoding local video: {file.filename}")
+    audio = await decode_upload(file)
+    if profile == "auto":
+        # Probe while the request still holds the upload; auto picks settings from the duration
+        audio.expected_duration = await probe_upload(file)
+    return cache_key, audio
 
-            start = time.time()
-            transcription_data = await asyncio.get_event_loop().run_in_executor(
-                executor, transcribe_video, temp_path
-            )
-            logger.info(f"Transcription completed in {time.time() - start:.2f} seconds")
+def hash_file(f) -> str:
+    digest = hashlib.sha256()
+    f.seek(0)
+    while chunk := f.read(1024 * 1024):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
 
-            background_tasks.add_task(cleanup_file, temp_path)
+def _with_duration(on_segment, audio: PCMBuffer, duration_hint: float = None):
+    """Adapt on_segment(segment, duration) to the transcriber's callback; the duration is known once decoding ends."""
+    if on_segment is None:
+        return None
 
-            return {
-                "message": "Local video processed successfully",
-                "transcription": transcription_data,
-                "duration": duration
-            }
-        except Exception as e:
-            background_tasks.add_task(cleanup_file, temp_path)
-            logger.error(f"Error processing local video: {e}")
-            raise HTTPException(status_code=500, detail=f"Local video processing failed: {str(e)}")
+    def callback(segment):
+        on_segment(segment, duration=duration_hint or audio.expected_duration or (audio.duration if audio.finished else None))
 
-async def process_youtube_video(youtube_url: str):
-    logger.info(f"Processing YouTube URL: {youtube_url}")
+    return callback
+
+async def process_local_video(audio: PCMBuffer, on_segment=None, profile: str = None):
+    logger.info(f"Processing local video: {audio.source}")
+    try:
+        start = time.time()
+        async with admission.stage("transcribe"):
+            resolved = resolve_profile(profile, audio.expected_duration)
+            transcription_data = await collect_transcription(audio, _with_duration(on_segment, audio), resolved)
+        duration = audio.duration
+        logger.info(f"Transcription completed in {time.time() - start:.2f} seconds. Duration: {duration:.2f}s")
+
+        return {
+            "message": "Local video processed successfully",
+            "transcription": transcription_data,
+            "duration": duration,
+            "profile": resolved["name"]
+        }
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing local video: {e}")
+        raise HTTPException(status_code=500, detail=f"Local video processing failed: {str(e)}")
+
+YDL_OPTS = {
+    "format": "bestaudio[ext=webm]",
+    "quiet": True,
+    "noplaylist": True,
+    "retries": 3,
+    "http_headers": {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 \
+        (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
+    }
+}
+
+def validate_youtube_url(youtube_url: str):
     # Relaxed validation for youtube.com and youtu.be
     if not youtube_url.startswith(("https://www.youtube.com/", "https://youtu.be/", "https://youtube.com/")):
         logger.error(f"Invalid YouTube URL: {youtube_url}")
         raise HTTPException(status_code=400, detail="Invalid YouTube URL")
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        audio_path = os.path.join(temp_dir, "audio.webm")
-        ydl_opts = {
-            "format": "bestaudio[ext=webm]",
-            "outtmpl": audio_path,
-            "quiet": True,
-            "noplaylist": True,
-            "retries": 3,
-            "http_headers": {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 \
-                (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
-            }
+async def process_youtube_video(youtube_url: str, on_segment=None, profile: str = None):
+    logger.info(f"Processing YouTube URL: {youtube_url}")
+    validate_youtube_url(youtube_url)
+    try:
+        resolved = await resolve_youtube(youtube_url, profile)
+        return await transcribe_youtube(youtube_url, resolved, on_segment, profile)
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"YouTube processing error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"YouTube processing failed: {str(e)}")
+
+async def resolve_youtube(youtube_url: str, profile: str = None) -> dict:
+    """Network stage: look up the audio stream and, in caption-first mode, fetch a usable subtitle track."""
+    start = time.time()
+    async with admission.stage("download"):
+        info = await asyncio.to_thread(resolve_youtube_audio, youtube_url, YDL_OPTS)
+        captions = None
+        if YOUTUBE_CAPTIONS:
+            # The accurate profile only trusts uploader subtitles, not automatic captions
+            allow_automatic = (profile or TRANSCRIBE_PROFILE) != "accurate"
+            captions = await asyncio.to_thread(fetch_captions, info, YDL_OPTS, allow_automatic)
+    logger.info(f"Resolved {youtube_url} in {time.time() - start:.2f} seconds")
+    return {"info": info, "captions": captions}
+
+async def transcribe_youtube(youtube_url: str, resolved: dict, on_segment=None, profile: str = None):
+    info, captions = resolved["info"], resolved["captions"]
+    if captions is not None:
+        duration = info.get("duration") or captions[-1]["end"]
+        builder = TranscriptBuilder()
+        for segment in captions:
+            builder.append(segment)
+            if on_segment is not None:
+                on_segment(segment, duration)
+        logger.info(f"Used YouTube captions for {youtube_url} instead of transcribing")
+        return {
+            "message": "YouTube video processed successfully",
+            "transcription": builder.build(),
+            "duration": duration
         }
+    if not info.get("url"):
+        logger.error(f"No audio stream found for {youtube_url}")
+        raise HTTPException(status_code=500, detail="Failed to download YouTube audio")
 
-        try:
-            start = time.time()
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=True)
-                duration = info.get("duration", 0)
-            logger.info(f"YouTube download completed in {time.time() - start:.2f} seconds. Duration: {duration:.2f}s")
-
-            if not os.path.exists(audio_path):
-                logger.error(f"Audio file not found at {audio_path}")
-                raise HTTPException(status_code=500, detail="Failed to download YouTube audio")
-
-            start = time.time()
-            transcription_data = await asyncio.get_event_loop().run_in_executor(
-                executor, transcribe_video, audio_path
-            )
-            logger.info(f"Transcription completed in {time.time() - start:.2f} seconds")
-
-            return {
-                "message": "YouTube video processed successfully",
-                "transcription": transcription_data,
-                "duration": duration
-            }
-
-        except Exception as e:
-            logger.error(f"YouTube processing error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"YouTube processing failed: {str(e)}")
-
-def transcribe_video(video_path: str):
-    logger.info(f"Starting transcription for {video_path}")
-    if not os.path.exists(video_path):
-        logger.error(f"Video file not found at {video_path}")
-        raise HTTPException(status_code=500, detail=f"Video file not found at {video_path}")
-
-    segments, _ = model.transcribe(video_path, language="en", vad_filter=False, beam_size=5)
-    transcription = [
-        {"timestamp": seconds_to_hhmmss(segment.start), "text": segment.text.strip()}
-        for segment in segments
-    ]
-    logger.info(f"Transcription generated {len(transcription)} segments")
-    return transcription
-
-def cleanup_file(temp_path: str):
+    # ffmpeg pulls the stream itself; transcription starts as soon as the first chunks are decoded
+    audio = None
     try:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-            logger.info(f"Cleaned up temp file: {temp_path}")
-    except Exception as e:
-        logger.warning(f"Failed to delete {temp_path}: {str(e)}")
\ No newline at end of file
+        start = time.time()
+        async with admission.stage("transcribe"):
+            audio = await decode_url(info["url"], info.get("http_headers"), source=youtube_url)
+            resolved = resolve_profile(profile, info.get("duration"))
+            transcription_data = await collect_transcription(
+                audio, _with_duration(on_segment, audio, info.get("duration")), resolved
+            )
+        duration = audio.duration
+        logger.info(f"Download and transcription completed in {time.time() - start:.2f} seconds. Duration: {duration:.2f}s")
+
+        return {
+            "message": "YouTube video processed successfully",
+            "transcription": transcription_data,
+            "duration": duration,
+            "profile": resolved["name"]
+        }
+    finally:
+        if audio is not None:
+            audio.close()
+
+def resolve_youtube_audio(youtube_url: str, ydl_opts: dict) -> dict:
+    """Look up the audio stream URL (and the headers it needs) without downloading anything."""
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(youtube_url, download=False)
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pipelines admitted at once (running or waiting on a stage); beyond this requests get a 429
+PIPELINE_MAX_PENDING = int(os.getenv("PIPELINE_MAX_PENDING", 16))
+
+STAGE_CONCURRENCY = {
+    "download": int(os.getenv("DOWNLOAD_CONCURRENCY", 4)),
+    "transcribe": int(os.getenv("TRANSCRIBE_CONCURRENCY", os.getenv("TRANSCRIBE_WORKERS", 2))),
+    "summarize": int(os.getenv("SUMMARIZE_CONCURRENCY", 4)),
+    "map": int(os.getenv("MAPPING_CONCURRENCY", 2)),
+}
+
+# Initial per-stage duration guesses (seconds) used for Retry-After until real timings arrive
+STAGE_SECONDS_GUESS = {"download": 20.0, "transcribe": 120.0, "summarize": 15.0, "map": 2.0}
+
+rejections = metrics.Counter("rejected_total", "Requests turned away by admission control, by status code")
+
+
+class Stage:
+    """Concurrency limit plus a bounded wait queue for one pipeline stage."""
+
+    def __init__(self, name: str, concurrency: int, max_waiting: int, expected_seconds: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.avg_seconds = expected_seconds
+        self.waiting = 0
+        self.active = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def drain_seconds(self) -> float:
+        """Rough time until a newly queued call would start."""
+        return (self.waiting + self.active) * self.avg_seconds / self.concurrency
+
+    def check(self):
+        if self.waiting >= self.max_waiting:
+            raise overloaded(503, f"{self.name} stage is saturated", self.waiting, self.drain_seconds())
+
+    @asynccontextmanager
+    async def slot(self):
+        self.check()
+        self.waiting += 1
+        queued = time.time()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        start = time.time()
+        metrics.stage_wait_seconds.observe(start - queued, stage=self.name)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            elapsed = time.time() - start
+            metrics.observe_stage(self.name, elapsed)
+            # Exponentially weighted so Retry-After follows recent load
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * elapsed
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "avg_seconds": round(self.avg_seconds, 3),
+        }
+
+
+class Overloaded(HTTPException):
+    """429/503 with queue depth and Retry-After; handlers re-raise it instead of wrapping it in a 500."""
+
+
+def overloaded(status_code: int, reason: str, queue_depth: int, retry_after: float) -> Overloaded:
+    retry_after = max(1, math.ceil(retry_after))
+    rejections.inc(status=status_code)
+    logger.warning(f"Rejecting request: {reason} (queue depth {queue_depth}, retry after {retry_after}s)")
+    return Overloaded(
+        status_code=status_code,
+        detail={"message": reason, "queue_depth": queue_depth, "retry_after": retry_after},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class AdmissionController:
+    def __init__(self, max_pending: int = PIPELINE_MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._released = asyncio.Event()
+        self.stages = {
+            name: Stage(name, concurrency, max_pending, STAGE_SECONDS_GUESS[name])
+            for name, concurrency in STAGE_CONCURRENCY.items()
+        }
+
+    def retry_after(self) -> float:
+        # The slowest stage to drain bounds when a new pipeline could make progress
+        return max(stage.drain_seconds() for stage in self.stages.values())
+
+    def check(self):
+        """Raise a 429 right away if another pipeline would exceed the pending limit."""
+        if self.pending >= self.max_pending:
+            raise overloaded(429, "Too many videos in progress", self.pending, self.retry_after())
+
+    def reserve(self):
+        """Admit one pipeline and return a callable that releases its slot (safe to call twice)."""
+        self.check()
+        self.pending += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.pending -= 1
+                # Wake every waiter, then arm a fresh event for the next release
+                changed, self._released = self._released, asyncio.Event()
+                changed.set()
+
+        return release
+
+    async def reserve_when_free(self):
+        """Like reserve(), but wait for a free slot instead of raising; for work already accepted, like later batch items."""
+        while self.pending >= self.max_pending:
+            await self._released.wait()
+        return self.reserve()
+
+    def stage(self, name: str):
+        return self.stages[name].slot()
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "stages": {name: stage.snapshot() for name, stage in self.stages.items()},
+        }
+
+
+admission = AdmissionController()
+
+
+@metrics.register_collector
+def collect_admission():
+    stages = admission.stages.values()
+    return [
+        ("pipelines_pending", "gauge", "Pipelines admitted and not yet finished", [({}, admission.pending)]),
+        ("stage_active", "gauge", "Calls running inside each stage", [({"stage": s.name}, s.active) for s in stages]),
+        ("stage_waiting", "gauge", "Calls queued for a slot in each stage", [({"stage": s.name}, s.waiting) for s in stages]),
+        ("stage_concurrency", "gauge", "Slots per stage", [({"stage": s.name}, s.concurrency) for s in stages]),
+    ]
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services import metrics
+from services.chunking import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+# Where decoded PCM lives while a video is processed (about 230 MB per hour of audio); default is the system temp dir
+PCM_DIR = os.getenv("PCM_DIR") or None
+
+READ_SIZE = 1024 * 1024
+BYTES_PER_SAMPLE = 4
+
+# Decode to what Whisper consumes: 16 kHz mono float32, no video
+_OUTPUT_ARGS = ["-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "pipe:1"]
+
+
+class PCMBuffer:
+    """16 kHz mono float32 samples that a single ffmpeg process is still appending to a file.
+
+    Consumers wait for enough samples, then memory-map the prefix that has been written; pool
+    workers map the same file by path. The duration is known once decoding has finished.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        fd, self.path = tempfile.mkstemp(suffix=".f32", dir=PCM_DIR)
+        self._file = os.fdopen(fd, "wb")
+        self._bytes = 0
+        self.finished = False
+        self.error = None
+        self.task = None
+        # Container duration from ffprobe, when the caller asked for it before decoding finished
+        self.expected_duration = None
+        self._changed = asyncio.Event()
+
+    @property
+    def samples(self) -> int:
+        return self._bytes // BYTES_PER_SAMPLE
+
+    @property
+    def duration(self) -> float:
+        return self.samples / SAMPLE_RATE
+
+    def array(self, stop: int = None) -> np.ndarray:
+        """Read-only view of the first `stop` samples (everything written so far by default)."""
+        stop = self.samples if stop is None else stop
+        if stop == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.memmap(self.path, dtype=np.float32, mode="r", shape=(stop,))
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        # Flush so memory maps opened by other processes see every counted sample
+        self._file.flush()
+
+    async def wait_for(self, samples: int) -> int:
+        """Wait until at least `samples` are available or decoding ends; returns the count available."""
+        while self.samples < samples and not self.finished:
+            await self._changed.wait()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return self.samples
+
+    async def wait_finished(self) -> int:
+        while not self.finished:
+            await self._changed.wait()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return self.samples
+
+    def close(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+async def _pump(process, buffer: PCMBuffer):
+    stderr = asyncio.create_task(process.stderr.read())
+    start = time.time()
+    try:
+        while data := await process.stdout.read(READ_SIZE):
+            await asyncio.to_thread(buffer._write, data)
+            buffer._bytes += len(data)
+            buffer._notify()
+        if await process.wait() != 0:
+            message = (await stderr).decode("utf-8", "replace").strip().splitlines()
+            buffer.error = f"ffmpeg failed: {message[-1] if message else process.returncode}"
+        else:
+            metrics.observe_stage("decode", time.time() - start)
+            logger.info(f"Decoded {buffer.duration:.2f} seconds of audio from {buffer.source}")
+    except asyncio.CancelledError:
+        buffer.error = "Decoding cancelled"
+        raise
+    except Exception as e:
+        buffer.error = f"Decoding failed: {str(e)}"
+    finally:
+        if process.returncode is None:
+            process.kill()
+        stderr.cancel()
+        buffer._file.close()
+        buffer.finished = True
+        buffer._notify()
+        if buffer.error:
+            logger.error(f"Audio decoding of {buffer.source} failed: {buffer.error}")
+
+
+async def _start(source: str, input_args: list, pass_fds=()) -> PCMBuffer:
+    buffer = PCMBuffer(source)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", *input_args, *_OUTPUT_ARGS,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            pass_fds=pass_fds
+        )
+    except Exception:
+        buffer._file.close()
+        buffer.close()
+        raise
+    buffer.task = asyncio.create_task(_pump(process, buffer))
+    return buffer
+
+
+async def probe_duration(path: str, pass_fds=()) -> float:
+    """Container duration in seconds from ffprobe, or None when it cannot be read."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFPROBE_BINARY, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            pass_fds=pass_fds
+        )
+        output, _ = await process.communicate()
+        return float(output.decode().strip())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not probe the duration of {path}: {str(e)}")
+        return None
+
+
+async def decode_file(path: str) -> PCMBuffer:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Video file not found at {path}")
+    return await _start(path, ["-i", path])
+
+
+async def decode_url(url: str, headers: dict = None, source: str = None) -> PCMBuffer:
+    """Decode straight from an HTTP(S) media URL, so transcription can start mid-download."""
+    input_args = ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+    if headers:
+        input_args += ["-headers", "".join(f"{name}: {value}\r\n" for name, value in headers.items())]
+    return await _start(source or url, input_args + ["-i", url])
+
+
+async def decode_upload(file) -> PCMBuffer:
+    """Decode an UploadFile from the request's own spool file, without copying it anywhere.
+
+    ffmpeg inherits the descriptor and reopens it through /dev/fd, which keeps the input
+    seekable (MP4s with a trailing moov atom cannot be read from a pipe) and lets decoding
+    carry on after the request has closed the upload.
+    """
+    # fileno() rolls a small in-memory spool over to its temp file first
+    fd = await asyncio.to_thread(file.file.fileno)
+    return await decode_fd(fd, file.filename or "upload")
+
+
+async def decode_fd(fd: int, source: str) -> PCMBuffer:
+    return await _start(source, ["-i", f"/dev/fd/{fd}"], pass_fds=(fd,))
+
+
+async def probe_upload(file) -> float:
+    fd = await asyncio.to_thread(file.file.fileno)
+    return await probe_duration(f"/dev/fd/{fd}", pass_fds=(fd,))
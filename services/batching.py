@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+batch_items = metrics.Histogram(
+    "batch_items", "Items per micro-batch run", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+batch_requests = metrics.Histogram(
+    "batch_requests", "Caller requests merged into each micro-batch run", buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32)
+)
+batch_wait_seconds = metrics.Histogram(
+    "batch_wait_seconds", "Time a request waited for its micro-batch to start",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+
+class _Request:
+    def __init__(self, items: list):
+        self.items = items
+        self.created = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Merge concurrent callers' items into one run_batch(items) call.
+
+    submit() blocks its (worker) thread until its own slice of the results is back. A batch starts once
+    max_items items are waiting or the oldest request has waited max_delay seconds, so a lone caller
+    pays at most max_delay. run_batch must return one result per item, in order (a list or an array).
+    """
+
+    def __init__(self, name: str, run_batch, max_items: int, max_delay: float):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._pending = []
+        self._pending_items = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, items: list):
+        if not items or self.max_delay <= 0:
+            return self.run_batch(items)
+        request = _Request(items)
+        with self._cond:
+            self._pending.append(request)
+            self._pending_items += len(items)
+            if self._thread is None:
+                # Started lazily, so processes forked before the first call do not inherit a dead thread
+                self._thread = threading.Thread(target=self._loop, name=f"batcher-{self.name}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _take(self) -> list:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0].created + self.max_delay
+            while self._pending_items < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, count = [], 0
+            # Always take at least one request, even one larger than max_items
+            while self._pending and (not batch or count + len(self._pending[0].items) <= self.max_items):
+                request = self._pending.pop(0)
+                batch.append(request)
+                count += len(request.items)
+            self._pending_items -= count
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take()
+            items = [item for request in batch for item in request.items]
+            started = time.monotonic()
+            for request in batch:
+                batch_wait_seconds.observe(started - request.created, batcher=self.name)
+            batch_items.observe(len(items), batcher=self.name)
+            batch_requests.observe(len(batch), batcher=self.name)
+            try:
+                results = self.run_batch(items)
+                offset = 0
+                for request in batch:
+                    request.result = results[offset:offset + len(request.items)]
+                    offset += len(request.items)
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(items)} items failed: {str(e)}")
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.done.set()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """In-memory LRU with a max entry count and a max age in seconds."""
+
+    def __init__(self, max_items: int = 256, max_age: float = None):
+        self.max_items = max_items
+        self.max_age = max_age
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if self.max_age is not None and time.time() - stored_at > self.max_age:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, stored_at: float = None):
+        with self._lock:
+            self._data[key] = (stored_at or time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskStore:
+    """JSON-file store bounded by total size and entry age.
+
+    Each entry is one file named after the SHA-256 of its key, so arbitrary
+    keys are safe to use as file names. Eviction removes expired entries
+    first, then the least recently written ones until the store fits.
+
+    Writes keep a running size total and only scan the directory when it
+    crosses max_bytes, or every SCAN_INTERVAL seconds to pick up other
+    processes' writes and expired entries.
+    """
+
+    SCAN_INTERVAL = 300.0
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # Bytes on disk as of the last scan plus this process's writes since; None until the first scan
+        self._bytes = None
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                self._remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            return None
+
+    def put(self, key: str, value):
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        with self._lock:
+            if self._bytes is not None:
+                # Deletes are not subtracted, so the total can only overestimate and scan early
+                self._bytes += size - replaced
+            scan = (
+                self._bytes is None or self._bytes > self.max_bytes
+                or time.time() - self._scanned_at > self.SCAN_INTERVAL
+            )
+        if scan:
+            self.evict()
+
+    def delete(self, key: str):
+        self._remove(self._path(key))
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            now = time.time()
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    self._remove(path)
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            self._bytes = total
+            self._scanned_at = now
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to delete cache file {path}: {str(e)}")
+
+
+class TieredCache:
+    """Memory LRU in front of an optional size-bounded disk store.
+
+    Values must be JSON-serializable. A disk hit is promoted into memory.
+    """
+
+    def __init__(self, memory: LRUCache, disk: DiskStore = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            return None
+        value = self.disk.get(key)
+        if value is not None:
+            self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except Exception as e:
+                logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
@@ -0,0 +1,126 @@
+import html
+import logging
+import os
+import re
+
+import yt_dlp
+
+from services import metrics
+from services.transcript import hhmmss_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Use YouTube's own subtitles when they look complete, instead of transcribing the audio
+YOUTUBE_CAPTIONS = os.getenv("YOUTUBE_CAPTIONS", "1") == "1"
+# Track languages in order of preference; "-orig" is the auto-caption track in the spoken language
+CAPTION_LANGUAGES = [lang.strip() for lang in os.getenv("CAPTION_LANGUAGES", "en,en-US,en-GB,en-orig").split(",") if lang.strip()]
+# Quality gate: captions must cover this share of the video and carry at least this many words per minute
+CAPTION_MIN_COVERAGE = float(os.getenv("CAPTION_MIN_COVERAGE", 0.8))
+CAPTION_MIN_WORDS_PER_MINUTE = float(os.getenv("CAPTION_MIN_WORDS_PER_MINUTE", 30))
+# Cues like "[Music]" or "(applause)" that carry no speech
+CAPTION_MAX_NON_SPEECH = 0.5
+
+_CUE_TIMING = re.compile(r"^\s*(\d[\d:.]*)\s+-->\s+(\d[\d:.]*)")
+_TAG = re.compile(r"<[^>]+>")
+_NON_SPEECH = re.compile(r"^[\[(][^\])]*[\])]$")
+
+caption_outcomes = metrics.Counter("youtube_captions_total", "Caption-first lookups, by outcome (used, missing, rejected, failed)")
+
+
+def pick_track(info: dict, allow_automatic: bool = True):
+    """Return (language, url, automatic) for the best VTT subtitle track, or None.
+
+    Uploader subtitles win over automatic captions in any listed language.
+    """
+    sources = [(info.get("subtitles") or {}, False)]
+    if allow_automatic:
+        sources.append((info.get("automatic_captions") or {}, True))
+    for tracks, automatic in sources:
+        for language in CAPTION_LANGUAGES:
+            for track in tracks.get(language) or []:
+                if track.get("ext") == "vtt" and track.get("url"):
+                    return language, track["url"], automatic
+    return None
+
+
+def parse_vtt(text: str) -> list:
+    """WebVTT cues to {"start", "end", "text"} segments.
+
+    YouTube's automatic captions roll: each cue repeats the previous cue's line above the new one
+    (with inline word timings), so only lines the previous cue did not show are kept.
+    """
+    segments = []
+    previous_lines = set()
+    # Only truly empty lines end a cue; automatic captions use lines holding a single space inside cues
+    blocks = re.split(r"\n\n+", text.replace("\r\n", "\n").strip())
+    for block in blocks:
+        lines = block.splitlines()
+        timing = None
+        for i, line in enumerate(lines):
+            timing = _CUE_TIMING.match(line)
+            if timing:
+                break
+        if timing is None:
+            # Header, NOTE, STYLE and REGION blocks
+            continue
+        cue_lines = [
+            re.sub(r"\s+", " ", html.unescape(_TAG.sub("", line))).strip() for line in lines[i + 1:]
+        ]
+        cue_lines = [line for line in cue_lines if line]
+        new_lines = [line for line in cue_lines if line not in previous_lines]
+        previous_lines = set(cue_lines)
+        if not new_lines:
+            continue
+        segments.append({
+            "start": hhmmss_to_seconds(timing.group(1)),
+            "end": hhmmss_to_seconds(timing.group(2)),
+            "text": " ".join(new_lines),
+        })
+    return segments
+
+
+def check_quality(segments: list, duration: float = None):
+    """Return None when the captions can stand in for a transcript, otherwise the reason they cannot."""
+    if not segments:
+        return "no cues"
+    non_speech = sum(1 for segment in segments if _NON_SPEECH.match(segment["text"]))
+    if non_speech / len(segments) > CAPTION_MAX_NON_SPEECH:
+        return f"{non_speech} of {len(segments)} cues are non-speech"
+    span = duration or segments[-1]["end"]
+    if duration and segments[-1]["end"] < CAPTION_MIN_COVERAGE * duration:
+        return f"captions end at {segments[-1]['end']:.0f}s of {duration:.0f}s"
+    words = sum(len(segment["text"].split()) for segment in segments)
+    if span > 0 and words / (span / 60) < CAPTION_MIN_WORDS_PER_MINUTE:
+        return f"only {words / (span / 60):.0f} words per minute"
+    return None
+
+
+def fetch_captions(info: dict, ydl_opts: dict, allow_automatic: bool = True):
+    """Download and parse the best subtitle track from an extract_info result into segments; None when unsuitable.
+
+    Only the subtitle file is fetched (a few kB), never the media.
+    """
+    source = info.get("webpage_url") or info.get("id")
+    track = pick_track(info, allow_automatic)
+    if track is None:
+        caption_outcomes.inc(outcome="missing")
+        logger.info(f"No usable subtitle track for {source}")
+        return None
+    language, url, automatic = track
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            text = ydl.urlopen(url).read().decode("utf-8", "replace")
+    except Exception as e:
+        caption_outcomes.inc(outcome="failed")
+        logger.warning(f"Fetching {language} captions for {source} failed: {str(e)}")
+        return None
+    segments = parse_vtt(text)
+    problem = check_quality(segments, info.get("duration"))
+    kind = "automatic" if automatic else "uploader"
+    if problem:
+        caption_outcomes.inc(outcome="rejected")
+        logger.info(f"Rejected {kind} {language} captions for {source}: {problem}")
+        return None
+    caption_outcomes.inc(outcome="used")
+    logger.info(f"Using {kind} {language} captions for {source} ({len(segments)} segments)")
+    return segments
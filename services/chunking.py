@@ -0,0 +1,75 @@
+import re
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Energy is measured over short frames; split points snap to the quietest one in range
+FRAME_SECONDS = 0.05
+SMOOTHING_FRAMES = 10
+
+
+def _frame_energy(audio: np.ndarray, frame: int) -> np.ndarray:
+    usable = len(audio) - len(audio) % frame
+    frames = np.asarray(audio[:usable], dtype=np.float32).reshape(-1, frame)
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    if len(energy) >= SMOOTHING_FRAMES:
+        energy = np.convolve(energy, np.ones(SMOOTHING_FRAMES) / SMOOTHING_FRAMES, mode="same")
+    return energy
+
+
+def next_split_point(
+    audio: np.ndarray,
+    start: int,
+    min_seconds: float,
+    max_seconds: float,
+    target_seconds: float,
+    sample_rate: int = SAMPLE_RATE
+) -> int:
+    """Return the sample at which the chunk beginning at `start` should end.
+
+    Only audio up to start + max_seconds is read, so this works on a prefix that is still growing.
+    The quietest frame between min_seconds and max_seconds wins, with ties broken towards target_seconds.
+    """
+    frame = max(1, int(FRAME_SECONDS * sample_rate))
+    lo = start + int(min_seconds * sample_rate) // frame * frame
+    hi = min(start + int(max_seconds * sample_rate), len(audio))
+    energy = _frame_energy(audio[lo:hi], frame)
+    if len(energy) == 0:
+        return hi
+    target = (int(target_seconds * sample_rate) - (lo - start)) / frame
+    distance = np.abs(np.arange(len(energy)) - target) / max(1, len(energy))
+    # Energy dominates; the distance term only separates near-equal candidates
+    score = energy / (energy.max() + 1e-9) + 0.05 * distance
+    return lo + int(np.argmin(score)) * frame
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]", "", text.lower()).strip()
+
+
+class SegmentMerger:
+    """Stitch per-chunk segments (absolute start/end seconds) into one ordered transcript.
+
+    Chunk i nominally covers [bounds[i], bounds[i + 1]) but is decoded with some trailing
+    overlap. Segments that start past the nominal end belong to the next chunk, and a
+    segment at the head of a chunk is dropped when it repeats the tail of the previous one.
+    """
+
+    def __init__(self, bounds_seconds: list, tolerance: float = 0.25):
+        self.bounds = bounds_seconds
+        self.tolerance = tolerance
+        self.last_end = None
+        self.last_text = ""
+
+    def accept(self, chunk_index: int, segment: dict) -> bool:
+        # bounds may still be growing while audio decodes; the last chunk has no overlap to trim anyway
+        if segment["start"] >= self.bounds[chunk_index + 1]:
+            return False
+        if self.last_end is not None and segment["start"] < self.last_end:
+            text = _normalize(segment["text"])
+            if segment["end"] <= self.last_end + self.tolerance or (text and text in self.last_text):
+                return False
+        self.last_end = segment["end"] if self.last_end is None else max(self.last_end, segment["end"])
+        self.last_text = _normalize(segment["text"])
+        return True
@@ -0,0 +1,239 @@
+"""Sentence embedding backends: the PyTorch SentenceTransformer, or an int8 ONNX Runtime export of it.
+
+The ONNX backend needs only onnxruntime and tokenizers (both already pulled in by faster-whisper), so a
+process that uses it never imports torch. The export is built once from the PyTorch model (which needs
+torch and onnx) and kept on disk; it is only used if its cosine scores match the PyTorch model's on a
+fixed sample.
+
+Deployment: run `python -m services.embedding_backends` once per image or volume (with EMBEDDING_ONNX_DIR
+and SENTENCE_MODEL_NAME as the app will see them). Otherwise the first process to need embeddings builds
+the export itself, loading PyTorch for the duration of the build.
+"""
+import fcntl
+import gc
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Largest allowed difference between the two backends' pairwise cosine scores on the parity sample
+EMBEDDING_PARITY_TOLERANCE = float(os.getenv("EMBEDDING_PARITY_TOLERANCE", 0.02))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", 0))
+
+BATCH_SIZE = 64
+POOLING_MODES = ("mean", "cls")
+# Written next to the export directory when building it failed, so the build is not retried on every start
+FAILURE_SUFFIX = ".failed.json"
+
+PARITY_SAMPLE = [
+    "The speaker introduces the main topic of the video.",
+    "Revenue grew by twelve percent compared to last year.",
+    "Next, we install the package and configure the environment.",
+    "Thanks for watching, and don't forget to subscribe.",
+    "The experiment failed because the sample was contaminated.",
+    "She explains how photosynthesis converts light into energy.",
+    "Let's look at the results of the second quarter.",
+    "The recipe needs two cups of flour and a pinch of salt.",
+]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode(self, texts: list) -> np.ndarray:
+        # Unit-length embeddings, so a dot product is the cosine similarity
+        return self.model.encode(texts, batch_size=BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True)
+
+
+class OnnxBackend:
+    name = "onnx-int8"
+
+    def __init__(self, directory: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.meta["pad_token_id"], pad_token=self.meta["pad_token"])
+        options = onnxruntime.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, "model_int8.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        columns = {
+            "input_ids": [encoding.ids for encoding in encodings],
+            "attention_mask": [encoding.attention_mask for encoding in encodings],
+            "token_type_ids": [encoding.type_ids for encoding in encodings],
+        }
+        feed = {name: np.asarray(columns[name], dtype=np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        if self.meta["pooling"] == "cls":
+            return hidden[:, 0]
+        mask = np.asarray(columns["attention_mask"], dtype=hidden.dtype)[..., None]
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.meta["dim"]), dtype=np.float32)
+        vectors = np.concatenate([
+            self._encode_batch(texts[i:i + BATCH_SIZE]) for i in range(0, len(texts), BATCH_SIZE)
+        ])
+        return _normalize(vectors).astype(np.float32)
+
+
+def parity_error(reference, candidate) -> float:
+    """Largest difference between the two backends' pairwise cosine scores on PARITY_SAMPLE."""
+    expected = reference.encode(PARITY_SAMPLE)
+    actual = candidate.encode(PARITY_SAMPLE)
+    return float(np.abs(expected @ expected.T - actual @ actual.T).max())
+
+
+def _write_json(path: str, data: dict):
+    # Temp file plus rename, so a concurrent reader never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def export_onnx(model, directory: str):
+    """Export a SentenceTransformer's encoder to ONNX in `directory`, quantize its weights to int8, and save its tokenizer."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    transformer, pooling = model[0], model[1]
+    pooling_mode = pooling.get_pooling_mode_str()
+    if pooling_mode not in POOLING_MODES:
+        raise ValueError(f"Unsupported pooling mode {pooling_mode}")
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(PARITY_SAMPLE[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+    fp32_path = os.path.join(directory, "model.onnx")
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(transformer.auto_model).eval(), tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes={name: axes for name in input_names + ["last_hidden_state"]},
+            opset_version=14, do_constant_folding=True
+        )
+    quantize_dynamic(fp32_path, os.path.join(directory, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.backend_tokenizer.save(os.path.join(directory, "tokenizer.json"))
+    _write_json(os.path.join(directory, "meta.json"), {
+        "pooling": pooling_mode,
+        "max_seq_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "dim": model.get_sentence_embedding_dimension(),
+    })
+
+
+def build_onnx(directory: str, load_torch_model):
+    """Export, quantize and parity-check in a scratch directory, then rename it into place.
+
+    Any failure (including a parity error above EMBEDDING_PARITY_TOLERANCE) is recorded next to
+    `directory`, so later starts skip straight to PyTorch instead of exporting again.
+    """
+    start = time.time()
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(directory)))
+    reference = None
+    try:
+        reference = TorchBackend(load_torch_model())
+        export_onnx(reference.model, work_dir)
+        error = parity_error(reference, OnnxBackend(work_dir))
+        if error > EMBEDDING_PARITY_TOLERANCE:
+            raise ValueError(f"parity error {error:.4f} is above the tolerance {EMBEDDING_PARITY_TOLERANCE}")
+        meta_path = os.path.join(work_dir, "meta.json")
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        _write_json(meta_path, {**meta, "parity_error": error})
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(work_dir, directory)
+    except Exception as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        _write_json(directory + FAILURE_SUFFIX, {"error": str(e), "time": time.time()})
+        raise
+    finally:
+        # load_torch_model hands over an uncached model; drop it so the process keeps only the ONNX session
+        reference = None
+        gc.collect()
+    logger.info(f"Exported int8 ONNX embeddings to {directory} in {time.time() - start:.2f} seconds (parity error {error:.4f})")
+
+
+def load_onnx(directory: str, load_torch_model) -> OnnxBackend:
+    """Load the ONNX export in `directory`, building it first if it does not exist yet.
+
+    Raises when the export cannot be built, an earlier build failed, or its scores drift from the
+    PyTorch model, so the caller can fall back to PyTorch.
+    """
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+        # One process builds the export; the others (web workers, the inference service) wait and reuse it
+        with open(directory + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(meta_path):
+                    failure_path = directory + FAILURE_SUFFIX
+                    if os.path.exists(failure_path):
+                        with open(failure_path, encoding="utf-8") as f:
+                            failure = json.load(f)
+                        raise RuntimeError(
+                            f"Building the ONNX export failed earlier ({failure['error']}); "
+                            "run `python -m services.embedding_backends` to retry"
+                        )
+                    build_onnx(directory, load_torch_model)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    backend = OnnxBackend(directory)
+    error = backend.meta.get("parity_error")
+    if error is None or error > EMBEDDING_PARITY_TOLERANCE:
+        raise ValueError(f"ONNX export at {directory} failed the parity check (error {error}, tolerance {EMBEDDING_PARITY_TOLERANCE})")
+    return backend
+
+
+if __name__ == "__main__":
+    # Build (or rebuild) the export ahead of time, e.g. while building an image: python -m services.embedding_backends
+    from services.logging_setup import setup_logging
+    from services.models import EMBEDDING_ONNX_DIR, load_sentence_model
+
+    setup_logging()
+    shutil.rmtree(EMBEDDING_ONNX_DIR, ignore_errors=True)
+    if os.path.exists(EMBEDDING_ONNX_DIR + FAILURE_SUFFIX):
+        os.remove(EMBEDDING_ONNX_DIR + FAILURE_SUFFIX)
+    load_onnx(EMBEDDING_ONNX_DIR, load_sentence_model)
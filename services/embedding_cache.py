@@ -0,0 +1,246 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from services import metrics
+from services.models import SENTENCE_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_CACHE_CAPACITY = int(os.getenv("EMBEDDING_CACHE_CAPACITY", 200000))
+# Processes that should never write (e.g. extra replicas sharing one volume) set this to 1
+EMBEDDING_CACHE_READ_ONLY = os.getenv("EMBEDDING_CACHE_READ_ONLY", "0") == "1"
+
+DIGEST_SIZE = 16
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """Fixed-capacity embedding store in memory-mapped NumPy files, shared between processes.
+
+    Layout under `directory`:
+      meta.json     dim and capacity
+      vectors.f32   capacity x dim float32 embeddings
+      keys.u8       capacity x 16 text digests (all zero = free slot)
+      used.f64      last-use time per slot, for LRU eviction
+      seq.i64       generation that last wrote each slot (-1 while a write is in progress)
+      generation    counter bumped on every write
+
+    Writers serialize on an flock; readers only map the files and never take the lock. A reader
+    re-reads just the slots whose sequence is newer than the generation it last saw, and drops any
+    hit whose sequence changed while its vector was being copied (the slot was evicted or rewritten).
+    """
+
+    def __init__(self, directory: str, capacity: int = EMBEDDING_CACHE_CAPACITY, read_only: bool = False):
+        self.directory = directory
+        self.capacity = capacity
+        self.read_only = read_only
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        # digest -> (slot, sequence it was read at), and slot -> digest
+        self._slots = {}
+        self._slot_keys = {}
+        self._generation = -1
+        self._lock = threading.Lock()
+        self._vectors = self._keys = self._used = self._seq = self._gen = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _map(self, dim: int = None) -> bool:
+        if self._vectors is not None:
+            return True
+        meta_path = self._path("meta.json")
+        if not os.path.exists(meta_path):
+            if dim is None or self.read_only:
+                return False
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path("lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Another process may have created the cache while we waited
+                    if not os.path.exists(meta_path):
+                        self.dim = dim
+                        self._open("w+")
+                        with open(meta_path, "w", encoding="utf-8") as f:
+                            json.dump({"dim": self.dim, "capacity": self.capacity}, f)
+                        logger.info(f"Created embedding cache at {self.directory} ({self.capacity} x {self.dim})")
+                        return True
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim, self.capacity = meta["dim"], meta["capacity"]
+        self._open("r" if self.read_only else "r+")
+        return True
+
+    def _open(self, mode: str):
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(self.capacity, self.dim))
+        self._keys = np.memmap(self._path("keys.u8"), dtype=np.uint8, mode=mode, shape=(self.capacity, DIGEST_SIZE))
+        self._used = np.memmap(self._path("used.f64"), dtype=np.float64, mode=mode, shape=(self.capacity,))
+        self._seq = np.memmap(self._path("seq.i64"), dtype=np.int64, mode=mode, shape=(self.capacity,))
+        self._gen = np.memmap(self._path("generation"), dtype=np.int64, mode=mode, shape=(1,))
+
+    def _forget(self, slot: int):
+        digest = self._slot_keys.pop(slot, None)
+        if digest is not None and self._slots.get(digest, (None,))[0] == slot:
+            del self._slots[digest]
+
+    def _refresh(self):
+        """Re-read the slots written since the generation this process last saw."""
+        generation = int(self._gen[0])
+        if generation == self._generation:
+            return
+        changed = np.flatnonzero((self._seq > self._generation) | (self._seq < 0))
+        # Free slots sit at sequence 0 and keys are never cleared, so skip them before the per-slot loop;
+        # otherwise a fresh reader walks the whole capacity
+        changed = changed[self._keys[changed].any(axis=1)]
+        seqs = self._seq[changed]
+        keys = self._keys[changed]
+        for slot, seq, key in zip(changed.tolist(), seqs.tolist(), keys):
+            self._forget(slot)
+            if seq >= 0:
+                digest = key.tobytes()
+                self._slots[digest] = (slot, seq)
+                self._slot_keys[slot] = digest
+        self._generation = generation
+
+    def _store(self, digests: list, vectors: np.ndarray):
+        with open(self._path("lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new = [(digest, vector) for digest, vector in zip(digests, vectors) if digest not in self._slots]
+                if not new:
+                    return
+                free = np.flatnonzero(~self._keys.any(axis=1))[:len(new)]
+                if len(free) < len(new):
+                    # Evict the least recently used occupied slots
+                    occupied = np.flatnonzero(self._keys.any(axis=1))
+                    count = len(new) - len(free)
+                    victims = occupied[np.argpartition(self._used[occupied], count - 1)[:count]]
+                    free = np.concatenate([free, victims])
+
+                now = time.time()
+                generation = int(self._gen[0]) + 1
+                for slot, (digest, vector) in zip(free.tolist(), new):
+                    # Readers that copy this slot from here on see a changed sequence and discard it
+                    self._seq[slot] = -1
+                    self._forget(slot)
+                    self._vectors[slot] = vector
+                    self._used[slot] = now
+                    self._keys[slot] = np.frombuffer(digest, dtype=np.uint8)
+                    self._seq[slot] = generation
+                    self._slots[digest] = (slot, generation)
+                    self._slot_keys[slot] = digest
+                self._gen[0] = generation
+                self._generation = generation
+                self._vectors.flush()
+                self._keys.flush()
+                self._used.flush()
+                self._seq.flush()
+                self._gen.flush()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def encode(self, texts: list, encoder) -> np.ndarray:
+        """Return one embedding row per text, calling encoder(list_of_texts) only for cache misses."""
+        if not texts:
+            return np.asarray(encoder([]), dtype=np.float32)
+        normalized = [normalize_text(text) for text in texts]
+        digests = [text_digest(text) for text in normalized]
+
+        hit_rows, hit_slots, hit_seqs = [], [], []
+        with self._lock:
+            if self._map():
+                self._refresh()
+                for i, digest in enumerate(digests):
+                    entry = self._slots.get(digest)
+                    if entry is not None:
+                        hit_rows.append(i)
+                        hit_slots.append(entry[0])
+                        hit_seqs.append(entry[1])
+                if hit_slots:
+                    hit_vectors = self._vectors[hit_slots]
+                    # Checked after the copy: another process may have evicted or rewritten a slot meanwhile
+                    valid = self._seq[hit_slots] == np.asarray(hit_seqs)
+                    if not valid.all():
+                        hit_rows = [row for row, ok in zip(hit_rows, valid) if ok]
+                        hit_slots = [slot for slot, ok in zip(hit_slots, valid) if ok]
+                        hit_vectors = hit_vectors[valid]
+                    if hit_slots and not self.read_only:
+                        self._used[hit_slots] = time.time()
+
+        hit_set = set(hit_rows)
+        missing = {}
+        for i in range(len(texts)):
+            if i not in hit_set:
+                missing.setdefault(digests[i], normalized[i])
+        self.hits += len(hit_rows)
+        self.misses += len(texts) - len(hit_rows)
+
+        if not missing:
+            return np.asarray(hit_vectors, dtype=np.float32)
+
+        miss_digests = list(missing)
+        vectors = np.asarray(encoder([missing[digest] for digest in miss_digests]), dtype=np.float32)
+        by_digest = dict(zip(miss_digests, vectors))
+
+        result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        if hit_rows:
+            result[hit_rows] = hit_vectors
+        for i in range(len(texts)):
+            if i not in hit_set:
+                result[i] = by_digest[digests[i]]
+
+        if not self.read_only:
+            with self._lock:
+                try:
+                    if self._map(dim=vectors.shape[1]):
+                        self._store(miss_digests, vectors)
+                except Exception as e:
+                    logger.warning(f"Failed to update embedding cache: {str(e)}")
+
+        return result
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(backend: str) -> EmbeddingCache:
+    """The cache for vectors from `backend` (e.g. "torch" or "onnx-int8").
+
+    One cache per model and backend, so neither a model switch nor fp32 and int8 vectors share an embedding space.
+    """
+    with _caches_lock:
+        cache = _caches.get(backend)
+        if cache is None:
+            cache = _caches[backend] = EmbeddingCache(
+                os.path.join(EMBEDDING_CACHE_DIR, SENTENCE_MODEL_NAME, backend),
+                read_only=EMBEDDING_CACHE_READ_ONLY
+            )
+        return cache
+
+
+@metrics.register_collector
+def collect_embedding_cache():
+    caches = list(_caches.values())
+    return metrics.cache_families("embedding", sum(c.hits for c in caches), sum(c.misses for c in caches))
@@ -0,0 +1,358 @@
+"""Model-hosting service shared by every HTTP worker.
+
+One process owns the Whisper pool and the sentence model, and serves transcription chunks and
+embedding requests over a Unix socket (multiprocessing.connection). HTTP workers started with
+INFERENCE_ADDRESS set send their work here instead of loading models themselves, so web
+concurrency and model memory can be sized separately. It also holds the state the workers must
+share: the job board (services/jobs.py) and the per-key LLM rate budget (services/llm.py). Run it
+standalone with
+
+    INFERENCE_ADDRESS=/run/video-insight/inference.sock python -m services.inference
+
+and start the web workers with the same INFERENCE_ADDRESS. Every connection must prove it knows the
+authkey: INFERENCE_AUTHKEY if set, otherwise a random key the service writes to
+<INFERENCE_ADDRESS>.key (mode 0600) and the workers read from there. Or let `python main.py` start
+the service automatically when WEB_WORKERS > 1.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import secrets
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import AuthenticationError, Client, Listener, answer_challenge, deliver_challenge
+
+logger = logging.getLogger(__name__)
+
+# Unset means models run inside this process, as with a single web worker
+INFERENCE_ADDRESS = os.getenv("INFERENCE_ADDRESS")
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY", "").encode() or None
+# Chunk streams one web worker relays at once; each holds a thread that mostly waits on the socket
+INFERENCE_MAX_STREAMS = int(os.getenv("INFERENCE_MAX_STREAMS", 32))
+# Job event streams one web worker follows at once; each holds a thread for up to LONG_POLL_SECONDS per poll
+INFERENCE_MAX_EVENT_STREAMS = int(os.getenv("INFERENCE_MAX_EVENT_STREAMS", 32))
+INFERENCE_CONNECT_TIMEOUT = float(os.getenv("INFERENCE_CONNECT_TIMEOUT", 120))
+
+POLL_SECONDS = 0.5
+# How long a job event stream request waits on the board for something new before returning empty
+LONG_POLL_SECONDS = 10.0
+# A connection that has not finished the authkey handshake by then is dropped
+AUTH_TIMEOUT_SECONDS = 5.0
+
+# Transcription chunk streams
+relay_executor = ThreadPoolExecutor(max_workers=INFERENCE_MAX_STREAMS, thread_name_prefix="inference-relay")
+# Quick calls that must not queue behind chunk streams: LLM budget, job sync, get and cancel
+control_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="inference-control")
+# Job event long-polls
+events_executor = ThreadPoolExecutor(max_workers=INFERENCE_MAX_EVENT_STREAMS, thread_name_prefix="inference-events")
+
+# Set once the service has answered a ping with its models loaded
+service_ready = False
+
+
+def remote_enabled() -> bool:
+    return bool(INFERENCE_ADDRESS)
+
+
+def default_address() -> str:
+    return os.path.join(tempfile.mkdtemp(prefix="video-insight-"), "inference.sock")
+
+
+def key_path(address: str) -> str:
+    return f"{address}.key"
+
+
+_authkey = None
+
+
+def client_authkey() -> bytes:
+    """INFERENCE_AUTHKEY, or the key a standalone service wrote next to its socket."""
+    global _authkey
+    if _authkey is None:
+        if INFERENCE_AUTHKEY:
+            _authkey = INFERENCE_AUTHKEY
+        else:
+            with open(key_path(INFERENCE_ADDRESS), "rb") as f:
+                _authkey = f.read().strip()
+    return _authkey
+
+
+def _connect():
+    return Client(INFERENCE_ADDRESS, family="AF_UNIX", authkey=client_authkey())
+
+
+def _call(*request):
+    with _connect() as conn:
+        conn.send(request)
+        status, payload = conn.recv()
+    if status == "error":
+        raise RuntimeError(f"Inference service: {payload}")
+    return payload
+
+
+# Client side, used by the HTTP workers
+
+def ping() -> dict:
+    return _call("ping")
+
+
+def wait_until_ready(timeout: float = INFERENCE_CONNECT_TIMEOUT) -> dict:
+    """Block until the service accepts connections and has loaded its models."""
+    global service_ready
+    deadline = time.time() + timeout
+    while True:
+        try:
+            status = ping()
+            if status["ready"]:
+                service_ready = True
+                return status
+        except (OSError, EOFError) as e:
+            if time.time() > deadline:
+                raise RuntimeError(f"Inference service at {INFERENCE_ADDRESS} unavailable: {str(e)}")
+        if time.time() > deadline:
+            raise RuntimeError(f"Inference service at {INFERENCE_ADDRESS} did not become ready")
+        time.sleep(POLL_SECONDS)
+
+
+def encode_remote(texts: list):
+    return _call("encode", texts)
+
+
+_embedding_backend = None
+
+
+def embedding_backend_remote() -> str:
+    """Name of the embedding backend the service settled on; fixed for the life of the service."""
+    global _embedding_backend
+    if _embedding_backend is None:
+        _embedding_backend = _call("embedding_backend")
+    return _embedding_backend
+
+
+def sync_jobs(updates: list, running: list) -> list:
+    """Push job updates to the shared board; returns the ids in `running` that were asked to cancel."""
+    return _call("job_sync", updates, running)
+
+
+def get_job(job_id: str):
+    return _call("job_get", job_id)
+
+
+def job_events(job_id: str, since: int) -> tuple:
+    return _call("job_events", job_id, since)
+
+
+def cancel_job(job_id: str) -> bool:
+    return _call("job_cancel", job_id)
+
+
+def llm_reserve(keys: int, tokens: int) -> tuple:
+    """(key index, 0) with that key's budget spent, or (None, seconds to wait) when every key is exhausted."""
+    return _call("llm_reserve", keys, tokens)
+
+
+def llm_cool_down(keys: int, index: int, seconds: float):
+    _call("llm_cool_down", keys, index, seconds)
+
+
+def transcribe_chunk_remote(
+    pcm_path: str, index: int, start: int, stop: int, segment_queue, cancel_event, profile: dict = None
+):
+    """Same contract as transcriber.transcribe_chunk_to_queue, with the chunk running in the service."""
+    try:
+        with _connect() as conn:
+            conn.send(("transcribe", pcm_path, index, start, stop, profile))
+            while True:
+                if cancel_event.is_set():
+                    conn.send(("cancel",))
+                    segment_queue.put(("done", index, 0))
+                    return
+                if not conn.poll(POLL_SECONDS):
+                    continue
+                message = conn.recv()
+                segment_queue.put(message)
+                if message[0] in ("done", "error"):
+                    return
+    except (OSError, EOFError) as e:
+        segment_queue.put(("error", index, f"Inference service connection failed: {str(e)}"))
+
+
+# Server side
+
+def _handle_transcribe(conn, pcm_path: str, index: int, start: int, stop: int, profile: dict = None):
+    from services import transcriber
+
+    manager = transcriber.get_manager()
+    segment_queue = manager.Queue()
+    cancel_event = manager.Event()
+    future = transcriber.executor.submit(
+        transcriber.transcribe_chunk_to_queue, pcm_path, index, start, stop, segment_queue, cancel_event, profile
+    )
+    try:
+        while True:
+            try:
+                message = segment_queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                # A message (or EOF) from the client means it gave up on this chunk
+                if conn.poll():
+                    cancel_event.set()
+                    future.cancel()
+                    return
+                if future.done() and future.exception() is not None:
+                    conn.send(("error", index, str(future.exception())))
+                    return
+                continue
+            conn.send(message)
+            if message[0] in ("done", "error"):
+                return
+    except (OSError, EOFError):
+        cancel_event.set()
+        future.cancel()
+
+
+def _set_recv_timeout(conn, seconds: float):
+    # SO_RCVTIMEO belongs to the socket itself, so setting it through a duplicate descriptor also
+    # bounds the Connection's reads; 0 turns the timeout off again
+    sock = socket.socket(fileno=os.dup(conn.fileno()))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack("ll", int(seconds), int(seconds % 1 * 1e6)))
+    finally:
+        sock.close()
+
+
+def _authenticate(conn, authkey: bytes) -> bool:
+    """The handshake Listener(authkey=...) would run in accept(), here in the connection's own thread."""
+    try:
+        _set_recv_timeout(conn, AUTH_TIMEOUT_SECONDS)
+        deliver_challenge(conn, authkey)
+        answer_challenge(conn, authkey)
+        _set_recv_timeout(conn, 0)
+        return True
+    except AuthenticationError as e:
+        logger.warning(f"Rejected inference connection: {str(e)}")
+    except (OSError, EOFError) as e:
+        logger.warning(f"Inference connection dropped during authentication: {str(e)}")
+    return False
+
+
+def _handle(conn, authkey: bytes):
+    from services import jobs, llm, models, transcriber
+
+    try:
+        if not _authenticate(conn, authkey):
+            return
+        request = conn.recv()
+        kind = request[0]
+        if kind == "transcribe":
+            _handle_transcribe(conn, *request[1:])
+            return
+        try:
+            if kind == "ping":
+                result = {
+                    "ready": transcriber.workers_ready and models.is_loaded("embedding:"),
+                    "pid": os.getpid(),
+                    "workers": dict(transcriber.worker_load_times),
+                    "load_times": dict(models.load_times),
+                }
+            elif kind == "encode":
+                # Requests from every HTTP worker meet here, so they batch together
+                result = models.sentence_batcher.submit(request[1])
+            elif kind == "embedding_backend":
+                result = models.get_embedding_backend().name
+            elif kind == "job_sync":
+                result = jobs.job_board.sync(*request[1:])
+            elif kind == "job_get":
+                result = jobs.job_board.get(request[1])
+            elif kind == "job_events":
+                result = jobs.job_board.events(request[1], request[2], timeout=LONG_POLL_SECONDS)
+            elif kind == "job_cancel":
+                result = jobs.job_board.cancel(request[1])
+            elif kind == "llm_reserve":
+                result = llm.shared_budget(request[1]).reserve(request[2])
+            elif kind == "llm_cool_down":
+                result = llm.shared_budget(request[1]).cool_down(request[2], request[3])
+            else:
+                raise ValueError(f"Unknown request {kind}")
+            conn.send(("ok", result))
+        except Exception as e:
+            logger.error(f"Inference request {kind} failed: {str(e)}")
+            conn.send(("error", str(e)))
+    except (OSError, EOFError):
+        pass
+    finally:
+        conn.close()
+
+
+def write_authkey(address: str) -> bytes:
+    """Generate a key and store it, readable by this user only, where client_authkey() looks for it."""
+    authkey = secrets.token_hex(16).encode()
+    path = key_path(address)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def serve(address: str, authkey: bytes = INFERENCE_AUTHKEY):
+    import asyncio
+    from services import models, transcriber
+    from services.logging_setup import setup_logging
+
+    global INFERENCE_ADDRESS
+    # This process hosts the models, so transcriber and mapping must run them locally
+    INFERENCE_ADDRESS = None
+    setup_logging()
+    # Requests are pickles, so only this user may reach the socket and every client must know the key
+    os.makedirs(os.path.dirname(address) or ".", mode=0o700, exist_ok=True)
+    if authkey is None:
+        authkey = write_authkey(address)
+        logger.info(f"Generated an inference authkey in {key_path(address)}")
+    if os.path.exists(address):
+        # A stale socket from a previous run; bind would fail otherwise
+        os.remove(address)
+    # No authkey here: accept() would run the handshake on this one thread, where a silent client blocks everyone
+    listener = Listener(address, family="AF_UNIX")
+    os.chmod(address, 0o600)
+    logger.info(f"Inference service listening on {address} (pid {os.getpid()})")
+
+    def warm_up():
+        try:
+            asyncio.run(transcriber.warm_up_workers())
+            models.get_embedding_backend()
+            logger.info("Inference service models ready")
+        except Exception as e:
+            logger.error(f"Inference service warm-up failed: {str(e)}")
+
+    # Let terminate() run the cleanup below instead of orphaning the pool workers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    threading.Thread(target=warm_up, daemon=True).start()
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError as e:
+                logger.warning(f"Accepting an inference connection failed: {str(e)}")
+                continue
+            threading.Thread(target=_handle, args=(conn, authkey), daemon=True).start()
+    finally:
+        listener.close()
+        transcriber.executor.shutdown(cancel_futures=True)
+
+
+def start_service(address: str, authkey: bytes) -> multiprocessing.Process:
+    process = multiprocessing.Process(target=serve, args=(address, authkey), name="inference-service")
+    process.start()
+    return process
+
+
+if __name__ == "__main__":
+    serve(INFERENCE_ADDRESS or default_address())
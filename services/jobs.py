@@ -0,0 +1,364 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+from services import inference
+
+logger = logging.getLogger(__name__)
+
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 3600))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", 500))
+# Events kept per job for late or resuming subscribers (one per transcript segment, so long media has thousands)
+JOB_MAX_EVENTS = int(os.getenv("JOB_MAX_EVENTS", 200))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# A running job whose worker has not synced it for this long is dropped from the shared board
+JOB_ORPHAN_SECONDS = 60
+
+
+class Job:
+    def __init__(self, job_id: str, source: str):
+        self.id = job_id
+        self.source = source
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Only the latest JOB_MAX_EVENTS; next_seq counts every event ever published
+        self.events = deque(maxlen=JOB_MAX_EVENTS)
+        self.next_seq = 0
+        self.task = None
+        # Called with (job, event) after every publish; set when jobs are shared between web workers
+        self.on_publish = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def snapshot(self) -> dict:
+        data = {
+            "job_id": self.id,
+            "source": self.source,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "completed":
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+    def publish(self, event_type: str, **data):
+        event = {"seq": self.next_seq, "type": event_type, "time": time.time(), **data}
+        self.events.append(event)
+        self.next_seq += 1
+        # Wake every waiter, then arm a fresh event for the next update
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if self.on_publish is not None:
+            self.on_publish(self, event)
+
+    def report(self, stage: str, progress: int, **data):
+        self.stage = stage
+        self.progress = progress
+        if self.status == "queued":
+            self.status = "running"
+        self.publish("progress", stage=stage, progress=progress, **data)
+
+    async def stream(self, since: int = 0):
+        """Yield events from seq `since` until the job finishes.
+
+        Events that have already been dropped from the history are skipped; the final status event is always kept.
+        """
+        position = since
+        while True:
+            while position < self.next_seq:
+                first = self.next_seq - len(self.events)
+                position = max(position, first)
+                yield self.events[position - first]
+                position += 1
+            if self.finished:
+                return
+            await self._changed.wait()
+
+
+class RemoteJob:
+    """A job running in another web worker, read through the inference service's job board."""
+
+    def __init__(self, job_id: str, snapshot: dict):
+        self.id = job_id
+        self._snapshot = snapshot
+
+    @property
+    def status(self) -> str:
+        return self._snapshot["status"]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def snapshot(self) -> dict:
+        return self._snapshot
+
+    async def stream(self, since: int = 0):
+        """Same contract as Job.stream, long-polling the board for new events."""
+        loop = asyncio.get_running_loop()
+        position = since
+        while True:
+            events, snapshot = await loop.run_in_executor(inference.events_executor, inference.job_events, self.id, position)
+            if snapshot is None:
+                return
+            self._snapshot = snapshot
+            for event in events:
+                yield event
+                position = event["seq"] + 1
+            if self.finished:
+                return
+
+
+class JobManager:
+    """Runs pipeline coroutines as background tasks and keeps their results for a bounded time.
+
+    With several web workers (inference.remote_enabled()), each job still runs in the worker that
+    accepted it, but its snapshot and events are mirrored to the inference service's JobBoard, so
+    status, events and cancellation work from whichever worker a request lands on.
+    """
+
+    def __init__(self, result_ttl: float = JOB_RESULT_TTL, max_finished: int = JOB_MAX_FINISHED):
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self._jobs = {}
+        # The sync thread reads _jobs while the event loop adds and purges entries
+        self._jobs_lock = threading.Lock()
+        # (job_id, snapshot, event or None) waiting to be pushed to the shared board
+        self._updates = queue.Queue()
+        self._sync_thread = None
+
+    async def submit(self, source: str, run, cleanup=None) -> Job:
+        """Start `run(report=job.report)` in the background and return its Job right away.
+
+        `cleanup` runs once the job has finished, whatever the outcome.
+        """
+        self.purge()
+        job = Job(uuid.uuid4().hex, source)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+        if inference.remote_enabled():
+            try:
+                # On the board before the caller answers, since the next request may land on another worker
+                await asyncio.get_running_loop().run_in_executor(
+                    inference.control_executor, inference.sync_jobs, [(job.id, job.snapshot(), None)], []
+                )
+            except asyncio.CancelledError:
+                # Never started, so the caller still owns its cleanup
+                with self._jobs_lock:
+                    del self._jobs[job.id]
+                raise
+            except Exception as e:
+                logger.warning(f"Registering job {job.id} with the inference service failed: {str(e)}")
+                self._share(job, None)
+            job.on_publish = self._share
+        job.task = asyncio.create_task(self._run(job, run, cleanup))
+        job.task.add_done_callback(lambda task: self._cancelled_before_start(job, cleanup))
+        logger.info(f"Job {job.id} queued for {source}")
+        return job
+
+    async def _run(self, job: Job, run, cleanup):
+        try:
+            job.result = await run(report=job.report)
+            job.status = "completed"
+            job.stage = "completed"
+            job.progress = 100
+            logger.info(f"Job {job.id} completed in {time.time() - job.created_at:.2f} seconds")
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            logger.info(f"Job {job.id} cancelled")
+        except Exception as e:
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+            logger.error(f"Job {job.id} failed: {job.error}")
+        finally:
+            self._finish(job, cleanup)
+
+    def _cancelled_before_start(self, job: Job, cleanup):
+        # A task cancelled before its first step never enters _run's try block
+        if not job.finished:
+            job.status = "cancelled"
+            self._finish(job, cleanup)
+
+    def _finish(self, job: Job, cleanup):
+        job.finished_at = time.time()
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception as e:
+                logger.warning(f"Cleanup for job {job.id} failed: {str(e)}")
+        final = {"result": job.result} if job.status == "completed" else {"error": job.error}
+        job.publish(job.status, **final)
+
+    def get(self, job_id: str):
+        self.purge()
+        return self._jobs.get(job_id)
+
+    async def find(self, job_id: str):
+        """The Job if it runs here, a RemoteJob if another web worker runs it, else None."""
+        job = self.get(job_id)
+        if job is not None or not inference.remote_enabled():
+            return job
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(inference.control_executor, inference.get_job, job_id)
+        return RemoteJob(job_id, snapshot) if snapshot is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.task.cancel()
+        return True
+
+    async def request_cancel(self, job) -> bool:
+        """Cancel a job found with find(); a remote one is cancelled by its own worker on its next sync."""
+        if isinstance(job, Job):
+            return self.cancel(job.id)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(inference.control_executor, inference.cancel_job, job.id)
+
+    def _share(self, job: Job, event):
+        self._updates.put((job.id, job.snapshot(), event))
+        if self._sync_thread is None:
+            self._sync_thread = threading.Thread(
+                target=self._sync_loop, args=(asyncio.get_running_loop(),), name="job-sync", daemon=True
+            )
+            self._sync_thread.start()
+
+    def _sync_loop(self, loop):
+        """Push queued updates to the board (at least every POLL_SECONDS while jobs run) and apply cancellations."""
+        updates = []
+        while True:
+            try:
+                updates.append(self._updates.get(timeout=inference.POLL_SECONDS))
+                while True:
+                    updates.append(self._updates.get_nowait())
+            except queue.Empty:
+                pass
+            with self._jobs_lock:
+                running = [job.id for job in self._jobs.values() if not job.finished]
+            if not updates and not running:
+                continue
+            try:
+                cancelled = inference.sync_jobs(updates, running)
+            except Exception as e:
+                logger.warning(f"Sharing job state with the inference service failed: {str(e)}")
+                # Retry on the next round, keeping only the newest updates
+                del updates[:-JOB_MAX_EVENTS]
+                continue
+            updates = []
+            for job_id in cancelled:
+                loop.call_soon_threadsafe(self.cancel, job_id)
+
+    def purge(self):
+        now = time.time()
+        with self._jobs_lock:
+            finished = [job for job in self._jobs.values() if job.finished]
+            for job in finished:
+                if now - job.finished_at > self.result_ttl:
+                    del self._jobs[job.id]
+            finished = sorted((job for job in finished if job.id in self._jobs), key=lambda job: job.finished_at)
+            for job in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job.id]
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class JobBoard:
+    """Snapshots and recent events of every web worker's jobs, kept by the inference service.
+
+    Workers push updates with sync(); its reply lists their running jobs that a request on some
+    other worker asked to cancel.
+    """
+
+    def __init__(self, result_ttl: float = JOB_RESULT_TTL, max_finished: int = JOB_MAX_FINISHED):
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._changed = threading.Condition()
+
+    def sync(self, updates: list, running: list) -> list:
+        now = time.time()
+        with self._changed:
+            for job_id, snapshot, event in updates:
+                entry = self._jobs.setdefault(job_id, {"events": deque(maxlen=JOB_MAX_EVENTS), "next_seq": 0, "cancel": False})
+                entry["snapshot"] = snapshot
+                if event is not None:
+                    entry["events"].append(event)
+                    entry["next_seq"] = event["seq"] + 1
+            for job_id in running:
+                if job_id in self._jobs:
+                    self._jobs[job_id]["seen"] = now
+            if updates:
+                self._changed.notify_all()
+                self._purge(now)
+            return [job_id for job_id in running if self._jobs.get(job_id, {}).get("cancel")]
+
+    def get(self, job_id: str):
+        with self._changed:
+            entry = self._jobs.get(job_id)
+            return entry["snapshot"] if entry is not None else None
+
+    def events(self, job_id: str, since: int, timeout: float) -> tuple:
+        """(events from seq `since`, snapshot), waiting up to `timeout` seconds for something new.
+
+        The snapshot is None once the job is unknown; a finished job returns everything left at once.
+        """
+        deadline = time.time() + timeout
+        with self._changed:
+            while True:
+                entry = self._jobs.get(job_id)
+                if entry is None:
+                    return [], None
+                finished = entry["snapshot"]["status"] in FINISHED_STATUSES
+                remaining = deadline - time.time()
+                if entry["next_seq"] > since or finished or remaining <= 0:
+                    return [event for event in entry["events"] if event["seq"] >= since], entry["snapshot"]
+                self._changed.wait(remaining)
+
+    def cancel(self, job_id: str) -> bool:
+        with self._changed:
+            entry = self._jobs.get(job_id)
+            if entry is None or entry["snapshot"]["status"] in FINISHED_STATUSES:
+                return False
+            entry["cancel"] = True
+            return True
+
+    def _purge(self, now: float):
+        finished = []
+        for job_id, entry in list(self._jobs.items()):
+            snapshot = entry["snapshot"]
+            if snapshot["status"] not in FINISHED_STATUSES:
+                # Its worker exited without finishing it
+                if now - entry.get("seen", snapshot["created_at"]) > JOB_ORPHAN_SECONDS:
+                    del self._jobs[job_id]
+            elif now - snapshot["finished_at"] > self.result_ttl:
+                del self._jobs[job_id]
+            else:
+                finished.append((snapshot["finished_at"], job_id))
+        for _, job_id in sorted(finished)[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager()
+job_board = JobBoard()
@@ -0,0 +1,352 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import os
+import random
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from services import inference, metrics
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# "gemini" talks to the API; "stub" answers locally so the pipeline runs without network or keys
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-1.5-flash")
+
+API_KEY_ENV_VARS = ["GOOGLE_API_KEY_1", "GOOGLE_API_KEY_2", "GOOGLE_API_KEY_3", "GOOGLE_API_KEY_4"]
+
+# Per-key quota (defaults match the gemini-1.5-flash free tier) and pool-wide limits
+LLM_KEY_RPM = int(os.getenv("LLM_KEY_RPM", 15))
+LLM_KEY_TPM = int(os.getenv("LLM_KEY_TPM", 1000000))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 2.0))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 60.0))
+
+# Rough characters per token for English text, and a typical response size, for TPM budgeting
+CHARS_PER_TOKEN = 4
+RESPONSE_TOKENS_ESTIMATE = 512
+
+
+class RateLimited(Exception):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def load_api_keys() -> list:
+    api_keys = [os.getenv(name) for name in API_KEY_ENV_VARS]
+    if not all(api_keys):
+        logger.error("One or more GOOGLE_API_KEYs not set")
+        raise RuntimeError("GOOGLE_API_KEYs missing in environment variables")
+    return api_keys
+
+
+class LLMClient(ABC):
+    """Minimal interface the summarization routes depend on."""
+
+    model_name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """The model's text response to `prompt`."""
+
+
+class GeminiClient(LLMClient):
+    """One API key. Blocking SDK calls run in a thread so the event loop stays free.
+
+    genai.configure() sets one key for the whole process, so each key gets its own
+    GenerativeServiceClient (the public client google.generativeai wraps), configured through its
+    client_options, and calls it directly.
+    """
+
+    def __init__(self, api_key: str, index: int, model_name: str = LLM_MODEL_NAME):
+        from google.ai import generativelanguage as glm
+
+        self.index = index
+        self.model_name = model_name
+        self._glm = glm
+        self._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+    def _generate(self, prompt: str) -> str:
+        glm = self._glm
+        response = self._client.generate_content(glm.GenerateContentRequest(
+            model=f"models/{self.model_name}",
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+        ))
+        candidates = list(response.candidates)
+        return "".join(part.text for part in candidates[0].content.parts) if candidates else ""
+
+    async def generate(self, prompt: str) -> str:
+        try:
+            text = await asyncio.to_thread(self._generate, prompt)
+        except Exception as e:
+            if "429" in str(e) or type(e).__name__ == "ResourceExhausted":
+                raise RateLimited(str(e)) from e
+            raise
+        if not text:
+            logger.error("Empty summary response from Gemini")
+            raise HTTPException(status_code=500, detail="Empty summary response")
+        return text
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, per_minute: float):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def fraction(self) -> float:
+        self._refill()
+        return self.tokens / self.capacity
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+
+class KeySlot:
+    """Per-key RPM/TPM buckets, 429 cooldown and call metrics."""
+
+    def __init__(self, client: GeminiClient, rpm: int, tpm: int):
+        self.client = client
+        self.requests = TokenBucket(rpm, rpm)
+        self.tokens = TokenBucket(tpm, tpm)
+        self.cooldown_until = 0.0
+        self.consecutive_429s = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.tokens_used = 0
+        self.latency_total = 0.0
+
+    def headroom(self, tokens: int) -> float:
+        if time.monotonic() < self.cooldown_until or self.wait_time(tokens) > 0:
+            return 0.0
+        return min(self.requests.fraction(), self.tokens.fraction())
+
+    def wait_time(self, tokens: int) -> float:
+        return max(
+            self.cooldown_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+        )
+
+    def metrics(self) -> dict:
+        return {
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "tokens_used": self.tokens_used,
+            "avg_latency": round(self.latency_total / self.calls, 3) if self.calls else None,
+            "rpm_headroom": round(self.requests.fraction(), 3),
+            "tpm_headroom": round(self.tokens.fraction(), 3),
+            "cooling_down": time.monotonic() < self.cooldown_until,
+        }
+
+
+class LLMPool(LLMClient):
+    """Schedules each call onto the key with the most RPM/TPM headroom.
+
+    Calls wait for budget rather than spending a request on a likely 429. A 429 still puts
+    the key into a jittered exponential cooldown, and the call is retried on another key.
+    """
+
+    def __init__(
+        self,
+        clients: list,
+        rpm: int = LLM_KEY_RPM,
+        tpm: int = LLM_KEY_TPM,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.slots = [KeySlot(client, rpm, tpm) for client in clients]
+        self.model_name = clients[0].model_name
+        self.max_retries = max_retries
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._schedule_lock = asyncio.Lock()
+
+    async def _acquire(self, tokens: int) -> KeySlot:
+        # One scheduler at a time, so two calls never both claim the last of a key's budget
+        async with self._schedule_lock:
+            while True:
+                if inference.remote_enabled():
+                    # Every web worker spends the same per-key budget, which the inference service keeps
+                    index, wait = await asyncio.get_running_loop().run_in_executor(
+                        inference.control_executor, inference.llm_reserve, len(self.slots), tokens
+                    )
+                    if index is not None:
+                        return self.slots[index]
+                else:
+                    slot = max(self.slots, key=lambda s: (s.headroom(tokens), -s.in_flight))
+                    if slot.headroom(tokens) > 0:
+                        slot.requests.consume(1)
+                        slot.tokens.consume(tokens)
+                        return slot
+                    wait = min(s.wait_time(tokens) for s in self.slots)
+                await asyncio.sleep(wait + 0.01)
+
+    async def generate(self, prompt: str) -> str:
+        # Prompt plus a typical response; a prompt larger than the bucket would otherwise wait forever
+        tokens = min(estimate_tokens(prompt) + RESPONSE_TOKENS_ESTIMATE, self.slots[0].tokens.capacity)
+        async with self._in_flight:
+            for attempt in range(self.max_retries + 1):
+                slot = await self._acquire(tokens)
+                slot.in_flight += 1
+                start = time.monotonic()
+                try:
+                    text = await slot.client.generate(prompt)
+                except RateLimited as e:
+                    slot.rate_limited += 1
+                    slot.consecutive_429s += 1
+                    backoff = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (slot.consecutive_429s - 1))
+                    cooldown = random.uniform(backoff / 2, backoff)
+                    slot.cooldown_until = time.monotonic() + cooldown
+                    if inference.remote_enabled():
+                        await asyncio.get_running_loop().run_in_executor(
+                            inference.control_executor, inference.llm_cool_down, len(self.slots), slot.client.index, cooldown
+                        )
+                    logger.warning(f"Rate limit hit for key {slot.client.index} (attempt {attempt + 1}): {str(e)}")
+                    continue
+                except Exception:
+                    slot.errors += 1
+                    raise
+                finally:
+                    slot.in_flight -= 1
+                slot.calls += 1
+                slot.consecutive_429s = 0
+                slot.tokens_used += tokens
+                slot.latency_total += time.monotonic() - start
+                logger.info(f"Generated response with key {slot.client.index}")
+                return text
+
+        logger.error("All API keys exhausted")
+        raise HTTPException(status_code=429, detail="All API keys exhausted")
+
+    def metrics(self) -> dict:
+        return {str(slot.client.index): slot.metrics() for slot in self.slots}
+
+
+class SharedBudget:
+    """Per-key RPM/TPM buckets and 429 cooldowns for all web workers, kept by the inference service.
+
+    Each worker's LLMPool reserves budget here before a call instead of from its own buckets, so N
+    workers together stay within one key's quota rather than N times it.
+    """
+
+    def __init__(self, keys: int, rpm: int = LLM_KEY_RPM, tpm: int = LLM_KEY_TPM):
+        self.slots = [KeySlot(None, rpm, tpm) for _ in range(keys)]
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> tuple:
+        with self._lock:
+            index = max(range(len(self.slots)), key=lambda i: self.slots[i].headroom(tokens))
+            slot = self.slots[index]
+            if slot.headroom(tokens) > 0:
+                slot.requests.consume(1)
+                slot.tokens.consume(tokens)
+                return index, 0.0
+            return None, min(s.wait_time(tokens) for s in self.slots)
+
+    def cool_down(self, index: int, seconds: float):
+        with self._lock:
+            slot = self.slots[index]
+            slot.cooldown_until = max(slot.cooldown_until, time.monotonic() + seconds)
+
+
+_shared_budget = None
+_shared_budget_lock = threading.Lock()
+
+
+def shared_budget(keys: int) -> SharedBudget:
+    global _shared_budget
+    with _shared_budget_lock:
+        if _shared_budget is None or len(_shared_budget.slots) != keys:
+            _shared_budget = SharedBudget(keys)
+        return _shared_budget
+
+
+class StubLLMClient(LLMClient):
+    """Deterministic offline model for tests and benchmarks.
+
+    Echoes every `every`-th "HH:MM:SS text" line of the prompt back as an insight, and
+    otherwise returns the first few sentences it finds.
+    """
+
+    model_name = "stub"
+
+    def __init__(self, every: int = 5, delay: float = 0.0):
+        self.every = every
+        self.delay = delay
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        lines = re.findall(r"^\s*(\d{2}:\d{2}:\d{2})\s+(.+?)\s*$", prompt, re.MULTILINE)
+        if lines:
+            picked = lines[::self.every] or lines[:1]
+            return "\n".join(f"{timestamp} {text.rstrip('.')}." for timestamp, text in picked)
+        sentences = re.findall(r"[^.!?]+[.!?]", prompt)
+        return " ".join(sentence.strip() for sentence in sentences[:7])
+
+
+_client = None
+
+
+def set_llm_client(client: LLMClient):
+    global _client
+    _client = client
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        if LLM_BACKEND == "stub":
+            _client = StubLLMClient()
+        else:
+            _client = LLMPool([GeminiClient(key, i) for i, key in enumerate(load_api_keys())])
+    return _client
+
+
+def llm_metrics() -> dict:
+    """Per-key metrics for the active pool, without creating one."""
+    return _client.metrics() if isinstance(_client, LLMPool) else {}
+
+
+@metrics.register_collector
+def collect_llm_keys():
+    slots = _client.slots if isinstance(_client, LLMPool) else []
+
+    def per_key(attribute: str) -> list:
+        return [({"key": str(slot.client.index)}, getattr(slot, attribute)) for slot in slots]
+
+    return [
+        ("llm_calls_total", "counter", "Successful LLM calls per API key", per_key("calls")),
+        ("llm_rate_limited_total", "counter", "429 responses per API key", per_key("rate_limited")),
+        ("llm_errors_total", "counter", "Other failed LLM calls per API key", per_key("errors")),
+        ("llm_tokens_total", "counter", "Estimated tokens sent per API key", per_key("tokens_used")),
+        ("llm_in_flight", "gauge", "LLM calls currently running per API key", per_key("in_flight")),
+    ]
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from services import metrics
+from services.cache import LRUCache, DiskStore, TieredCache
+from services.llm import get_llm_client
+
+logger = logging.getLogger(__name__)
+
+# Responses older than this are regenerated; 0 disables the cache (single-flight still applies)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+LLM_CACHE_MAX_ITEMS = int(os.getenv("LLM_CACHE_MAX_ITEMS", 1024))
+# Set a directory to keep responses across restarts
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+response_cache = TieredCache(
+    LRUCache(max_items=LLM_CACHE_MAX_ITEMS, max_age=LLM_CACHE_TTL),
+    DiskStore(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES, max_age=LLM_CACHE_TTL) if LLM_CACHE_DIR else None,
+)
+
+stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+_in_flight = {}
+
+
+def prompt_cache_key(model_name: str, template_version: str, prompt: str) -> str:
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return f"llm:{model_name}:{template_version}:{digest}"
+
+
+async def generate_cached(prompt: str, template_version: str) -> str:
+    """generate() through the response cache, with identical concurrent prompts sharing one upstream call.
+
+    Bump template_version whenever a template or the parsing of its output changes.
+    """
+    client = get_llm_client()
+    key = prompt_cache_key(client.model_name, template_version, prompt)
+
+    while True:
+        if LLM_CACHE_TTL > 0:
+            cached = response_cache.get(key)
+            if cached is not None:
+                stats["hits"] += 1
+                logger.info(f"LLM response cache hit ({template_version})")
+                return cached
+
+        leader = _in_flight.get(key)
+        if leader is None:
+            break
+        stats["coalesced"] += 1
+        try:
+            return await asyncio.shield(leader)
+        except asyncio.CancelledError:
+            if not leader.cancelled():
+                raise
+            # The leading request was cancelled, not us: try again, possibly as the new leader
+
+    stats["misses"] += 1
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        text = await client.generate(prompt)
+        if LLM_CACHE_TTL > 0:
+            response_cache.put(key, text)
+        future.set_result(text)
+        return text
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Followers re-raise it; mark it retrieved so an unshared failure is not logged twice
+        future.exception()
+        raise
+    finally:
+        _in_flight.pop(key, None)
+
+
+@metrics.register_collector
+def collect_llm_cache():
+    return metrics.cache_families("llm_response", stats["hits"], stats["misses"]) + [
+        ("llm_coalesced_total", "counter", "LLM calls served by an identical call already in flight", [({}, stats["coalesced"])]),
+    ]
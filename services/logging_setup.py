@@ -0,0 +1,15 @@
+import logging
+import os
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Libraries that log every request or download at INFO/DEBUG
+QUIET_LOGGERS = ("faster_whisper", "sentence_transformers", "urllib3", "google.generativeai", "httpx")
+
+
+def setup_logging():
+    """Configure the root logger once for the whole app (pool workers inherit it when forked)."""
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
@@ -0,0 +1,151 @@
+import contextvars
+import math
+import threading
+
+PREFIX = "video_insight_"
+
+# Seconds; stages range from sub-second mapping to hour-long transcriptions
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+# Per-request stage timings, set only while a profiled request is running
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items())) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _family(name: str, kind: str, help_text: str, samples: list) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{sample_name}{_format_labels(labels)} {_format_value(value)}" for sample_name, labels, value in samples]
+    return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = PREFIX + name
+        self.help = help_text
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with _lock:
+            samples = [(self.name, dict(key), value) for key, value in self._values.items()]
+        return _family(self.name, "counter", self.help, samples)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=STAGE_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        samples = []
+        with _lock:
+            for key, series in self._series.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, series["sum"]))
+                samples.append((f"{self.name}_count", labels, series["count"]))
+        return _family(self.name, "histogram", self.help, samples)
+
+
+def register_collector(collect):
+    """Add a callable returning [(name, kind, help, [(labels, value), ...]), ...], evaluated at scrape time.
+
+    For values that already live elsewhere (queue sizes, per-key LLM stats, cache counters).
+    """
+    _collectors.append(collect)
+    return collect
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    # Several collectors may report the same family (e.g. one cache each), so merge by name
+    families = {}
+    for collect in _collectors:
+        for name, kind, help_text, samples in collect():
+            families.setdefault(PREFIX + name, (kind, help_text, []))[2].extend(samples)
+    for name, (kind, help_text, samples) in families.items():
+        lines += _family(name, kind, help_text, [(name, labels, value) for labels, value in samples])
+    return "\n".join(lines) + "\n"
+
+
+def cache_families(cache: str, hits: int, misses: int) -> list:
+    labels = {"cache": cache}
+    return [
+        ("cache_hits_total", "counter", "Cache lookups that hit", [(labels, hits)]),
+        ("cache_misses_total", "counter", "Cache lookups that missed", [(labels, misses)]),
+        ("cache_hit_ratio", "gauge", "Hits over lookups since start", [(labels, hits / (hits + misses) if hits + misses else 0.0)]),
+    ]
+
+
+stage_seconds = Histogram("stage_seconds", "Time spent inside each pipeline stage once admitted")
+stage_wait_seconds = Histogram("stage_wait_seconds", "Time spent waiting for a stage slot")
+transcription_rtf = Histogram(
+    "transcription_real_time_factor",
+    "Audio seconds transcribed per wall-clock second, per transcription",
+    buckets=(0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def start_profile() -> dict:
+    """Collect stage timings for the current request (and tasks it starts) into the returned dict."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing(timings: dict, total: float) -> str:
+    """Server-Timing header value; durations are in milliseconds."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services import metrics
+from services.batching import MicroBatcher
+from services.embedding_backends import TorchBackend, load_onnx
+
+logger = logging.getLogger(__name__)
+
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "tiny.en")
+# Each transcription pool worker's share of the cores, so concurrent transcriptions do not oversubscribe them
+WHISPER_CPU_THREADS = max(1, os.cpu_count() // int(os.getenv("TRANSCRIBE_WORKERS", 2)))
+# Whisper models kept per process (one per model size and thread count); the least recently used is unloaded
+WHISPER_MAX_MODELS = int(os.getenv("WHISPER_MAX_MODELS", 2))
+SENTENCE_MODEL_NAME = os.getenv("SENTENCE_MODEL_NAME", "paraphrase-MiniLM-L6-v2")
+# "onnx" (int8 ONNX Runtime, falling back to PyTorch if it cannot be built or fails parity) or "torch".
+# Build the export at deploy time with `python -m services.embedding_backends`; otherwise the first process builds it
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(".cache", "onnx", SENTENCE_MODEL_NAME))
+# Encodes from concurrent requests are merged for up to this many texts or seconds (0 disables)
+SENTENCE_BATCH_MAX_TEXTS = int(os.getenv("SENTENCE_BATCH_MAX_TEXTS", 512))
+SENTENCE_BATCH_DELAY = float(os.getenv("SENTENCE_BATCH_DELAY", 0.01))
+
+# Seconds each model took to load in this process, keyed by model name
+load_times = {}
+
+_models = {}
+_whisper_keys = OrderedDict()
+# Re-entrant: the embedding backend factory may load the PyTorch model while holding it
+_lock = threading.RLock()
+
+
+def whisper_device():
+    # ctranslate2 answers this without importing torch
+    import ctranslate2
+    device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    compute_type = "float16" if device == "cuda" else "int8"
+    return device, compute_type
+
+
+def _load(key: str, factory):
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.time()
+            model = factory()
+            load_times[key] = time.time() - start
+            _models[key] = model
+            logger.info(f"Loaded {key} in {load_times[key]:.2f} seconds (pid {os.getpid()})")
+    return model
+
+
+def get_whisper_model(size: str = WHISPER_MODEL_SIZE, cpu_threads: int = WHISPER_CPU_THREADS):
+    def factory():
+        from faster_whisper import WhisperModel
+        device, compute_type = whisper_device()
+        logger.info(f"Loading Whisper {size} on {device.upper()} using {compute_type}")
+        return WhisperModel(size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+    # CTranslate2 fixes the thread count when the model loads, so it is part of the key
+    key = f"whisper:{size}:{cpu_threads}"
+    model = _load(key, factory)
+    with _lock:
+        _whisper_keys[key] = True
+        _whisper_keys.move_to_end(key)
+        while len(_whisper_keys) > WHISPER_MAX_MODELS:
+            evicted, _ = _whisper_keys.popitem(last=False)
+            _models.pop(evicted, None)
+            logger.info(f"Unloaded {evicted} to stay within WHISPER_MAX_MODELS (pid {os.getpid()})")
+    return model
+
+
+def load_sentence_model(name: str = SENTENCE_MODEL_NAME):
+    """A SentenceTransformer that is not kept in the model cache, e.g. for a one-off ONNX export."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def get_sentence_model(name: str = SENTENCE_MODEL_NAME):
+    return _load(f"sentence:{name}", lambda: load_sentence_model(name))
+
+
+def get_embedding_backend():
+    def factory():
+        if EMBEDDING_BACKEND == "onnx":
+            try:
+                # The PyTorch model is only needed to build the export, so it is not cached
+                return load_onnx(EMBEDDING_ONNX_DIR, load_sentence_model)
+            except Exception as e:
+                logger.warning(f"ONNX embedding backend unavailable, using PyTorch: {str(e)}")
+        return TorchBackend(get_sentence_model())
+
+    return _load(f"embedding:{SENTENCE_MODEL_NAME}", factory)
+
+
+def encode_sentences(texts: list):
+    """Unit-length embeddings, so a dot product is the cosine similarity."""
+    return get_embedding_backend().encode(texts)
+
+
+sentence_batcher = MicroBatcher("sentence", encode_sentences, SENTENCE_BATCH_MAX_TEXTS, SENTENCE_BATCH_DELAY)
+
+
+def is_loaded(key_prefix: str) -> bool:
+    return any(key.startswith(key_prefix) for key in _models)
+
+
+def init_worker(size: str = WHISPER_MODEL_SIZE, cpu_threads: int = WHISPER_CPU_THREADS):
+    """ProcessPoolExecutor initializer: load the default profile's Whisper model once per worker before it takes tasks."""
+    logging.getLogger("faster_whisper").setLevel(logging.WARNING)
+    get_whisper_model(size, cpu_threads)
+
+
+def worker_ready() -> dict:
+    # Runs inside a pool worker; the initializer has already loaded the model
+    return {"pid": os.getpid(), "load_times": dict(load_times)}
+
+
+@metrics.register_collector
+def collect_load_times():
+    return [("model_load_seconds", "gauge", "Model load time in this process", [
+        ({"model": key}, seconds) for key, seconds in load_times.items()
+    ])]
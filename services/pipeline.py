@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+stage_queue_seconds = metrics.Histogram(
+    "batch_stage_queue_seconds", "Time a batch item waited in the queue in front of each stage"
+)
+
+
+async def run_staged(items: list, stages: list, queue_size: int = 2):
+    """Push items through stages [(name, workers, async fn(item)), ...], yielding each item once it leaves the last stage.
+
+    Stages run concurrently with bounded queues between them, so a slow stage holds back the ones
+    before it instead of letting work pile up, and throughput is set by the slowest stage. An item
+    whose fn raises gets item["error"] and skips the remaining stages; an item with "result" already
+    set (e.g. from a cache) skips them too.
+    """
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+    finished = asyncio.Queue()
+
+    async def feed():
+        for item in items:
+            item["queued_at"] = time.time()
+            await queues[0].put(item)
+        for _ in range(stages[0][1]):
+            await queues[0].put(None)
+
+    async def run_stage(i: int):
+        name, workers, fn = stages[i]
+
+        async def worker():
+            while (item := await queues[i].get()) is not None:
+                stage_queue_seconds.observe(time.time() - item["queued_at"], stage=name)
+                if item.get("error") is None and item.get("result") is None:
+                    try:
+                        await fn(item)
+                    except Exception as e:
+                        detail = getattr(e, "detail", None) or str(e)
+                        if isinstance(detail, dict):
+                            # Structured details (e.g. Overloaded's queue depth and Retry-After) carry a message
+                            detail = detail.get("message") or str(detail)
+                        logger.error(f"Batch item {item.get('source')} failed in {name}: {detail}")
+                        item["error"] = f"{name} failed: {detail}"
+                item["queued_at"] = time.time()
+                await (queues[i + 1] if i + 1 < len(stages) else finished).put(item)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if i + 1 < len(stages):
+            for _ in range(stages[i + 1][1]):
+                await queues[i + 1].put(None)
+        else:
+            await finished.put(None)
+
+    tasks = [asyncio.create_task(feed())] + [asyncio.create_task(run_stage(i)) for i in range(len(stages))]
+    try:
+        while (item := await finished.get()) is not None:
+            yield item
+        # Surface a crash in the plumbing itself rather than ending the stream early without a word
+        for task in tasks:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,69 @@
+import logging
+import os
+
+from fastapi import HTTPException
+
+from services.admission import admission
+from services.models import WHISPER_CPU_THREADS, WHISPER_MODEL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Used when a request does not name a profile
+TRANSCRIBE_PROFILE = os.getenv("TRANSCRIBE_PROFILE", "balanced")
+WHISPER_FAST_MODEL = os.getenv("WHISPER_FAST_MODEL", "tiny.en")
+WHISPER_ACCURATE_MODEL = os.getenv("WHISPER_ACCURATE_MODEL", "base.en")
+# auto: media up to this long gets the accurate profile when the transcribe stage is idle
+AUTO_SHORT_SECONDS = float(os.getenv("AUTO_SHORT_SECONDS", 600))
+# auto: media longer than this always gets the fast profile
+AUTO_LONG_SECONDS = float(os.getenv("AUTO_LONG_SECONDS", 3600))
+# Threads per transcription for each profile; the default is each pool worker's share of the cores.
+# Each distinct model size and thread count is one more model in every worker (see WHISPER_MAX_MODELS).
+WHISPER_FAST_THREADS = int(os.getenv("WHISPER_FAST_THREADS", WHISPER_CPU_THREADS))
+WHISPER_BALANCED_THREADS = int(os.getenv("WHISPER_BALANCED_THREADS", WHISPER_CPU_THREADS))
+WHISPER_ACCURATE_THREADS = int(os.getenv("WHISPER_ACCURATE_THREADS", WHISPER_CPU_THREADS))
+
+PROFILES = {
+    # Greedy decoding with silence skipped; roughly 5x less decoding work than beam search
+    "fast": {"model_size": WHISPER_FAST_MODEL, "beam_size": 1, "vad_filter": True, "cpu_threads": WHISPER_FAST_THREADS},
+    "balanced": {"model_size": WHISPER_MODEL_SIZE, "beam_size": 5, "vad_filter": False, "cpu_threads": WHISPER_BALANCED_THREADS},
+    "accurate": {"model_size": WHISPER_ACCURATE_MODEL, "beam_size": 5, "vad_filter": False, "cpu_threads": WHISPER_ACCURATE_THREADS},
+}
+PROFILE_NAMES = tuple(PROFILES) + ("auto",)
+
+
+def validate_profile(name: str = None) -> str:
+    name = name or TRANSCRIBE_PROFILE
+    if name not in PROFILE_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile '{name}'; use one of {', '.join(PROFILE_NAMES)}")
+    return name
+
+
+def get_profile(name: str) -> dict:
+    return {"name": name, **PROFILES[name]}
+
+
+def auto_profile(duration: float = None) -> dict:
+    """Pick a profile from the media duration and how busy the transcribe stage is.
+
+    Called from inside a transcribe slot, so the calling request counts as one active transcription.
+    """
+    stage = admission.stages["transcribe"]
+    load = (stage.active + stage.waiting) / stage.concurrency
+    if load > 1 or (duration is not None and duration > AUTO_LONG_SECONDS):
+        name = "fast"
+    elif duration is not None and duration <= AUTO_SHORT_SECONDS and load <= 1 / stage.concurrency:
+        name = "accurate"
+    else:
+        name = "balanced"
+    logger.info(f"Auto profile chose {name} (duration={duration}, load={load:.2f})")
+    return get_profile(name)
+
+
+def default_profile() -> dict:
+    """The profile pool workers preload; auto starts from balanced."""
+    return get_profile("balanced" if TRANSCRIBE_PROFILE == "auto" else TRANSCRIBE_PROFILE)
+
+
+def resolve_profile(name: str = None, duration: float = None) -> dict:
+    name = name or TRANSCRIBE_PROFILE
+    return auto_profile(duration) if name == "auto" else get_profile(name)
@@ -0,0 +1,102 @@
+import logging
+import os
+import re
+from urllib.parse import urlparse, parse_qs
+
+from services import metrics
+from services.cache import LRUCache, DiskStore, TieredCache
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(".cache", "results"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+RESULT_CACHE_MAX_AGE = float(os.getenv("RESULT_CACHE_MAX_AGE", 7 * 24 * 3600))
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", 128))
+
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+stats = {"hits": 0, "misses": 0}
+
+result_cache = TieredCache(
+    LRUCache(max_items=RESULT_CACHE_MEMORY_ITEMS, max_age=RESULT_CACHE_MAX_AGE),
+    DiskStore(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES, max_age=RESULT_CACHE_MAX_AGE),
+)
+
+
+# Transcripts (and everything derived from them) differ per transcription profile, so it is part of every key
+def media_cache_key(sha256_hex: str, profile: str) -> str:
+    return f"sha256:{sha256_hex}:{profile}"
+
+
+def youtube_video_id(url: str):
+    """Return the canonical 11-character video ID for a YouTube URL, or None."""
+    parsed = urlparse(url)
+    host = parsed.netloc.lower().split(":")[0]
+    candidate = None
+    if host == "youtu.be":
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host.endswith("youtube.com"):
+        if parsed.path == "/watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        else:
+            parts = parsed.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                candidate = parts[1]
+    if candidate and _YOUTUBE_ID.match(candidate):
+        return candidate
+    return None
+
+
+def youtube_cache_key(url: str, profile: str):
+    video_id = youtube_video_id(url)
+    return f"youtube:{video_id}:{profile}" if video_id else None
+
+
+# auto picks a profile per run, so its results are stored under the key of the profile it picked.
+# An auto lookup takes whichever profile's transcript is cached, best first; "auto" itself holds
+# results that used no profile, i.e. YouTube captions.
+AUTO_LOOKUP_ORDER = ("accurate", "balanced", "fast", "auto")
+
+
+def profile_cache_key(cache_key: str, profile: str) -> str:
+    """`cache_key` with its profile (always the last field) replaced."""
+    return f"{cache_key.rsplit(':', 1)[0]}:{profile}"
+
+
+def find_cache_key(cache_key: str):
+    """The key to read cached results from: for an auto key, the first profile with a cached transcript."""
+    if not cache_key or not cache_key.endswith(":auto"):
+        return cache_key
+    for profile in AUTO_LOOKUP_ORDER:
+        key = profile_cache_key(cache_key, profile)
+        if result_cache.get(f"{key}:transcript") is not None:
+            return key
+    return cache_key
+
+
+def settle_cache_key(cache_key: str, resolved_profile: str):
+    """The key to store an auto run's results under, once transcription has picked `resolved_profile`."""
+    if cache_key and resolved_profile and cache_key.endswith(":auto"):
+        return profile_cache_key(cache_key, resolved_profile)
+    return cache_key
+
+
+def get_stage(cache_key: str, stage: str):
+    if not cache_key:
+        return None
+    value = result_cache.get(f"{cache_key}:{stage}")
+    stats["misses" if value is None else "hits"] += 1
+    if value is not None:
+        logger.info(f"Result cache hit for {cache_key} ({stage})")
+    return value
+
+
+def put_stage(cache_key: str, stage: str, value):
+    if cache_key:
+        result_cache.put(f"{cache_key}:{stage}", value)
+
+
+@metrics.register_collector
+def collect_result_cache():
+    return metrics.cache_families("result", stats["hits"], stats["misses"])
+
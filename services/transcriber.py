@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from services import inference, metrics
+from services.audio import PCMBuffer
+from services.chunking import SAMPLE_RATE, SegmentMerger, next_split_point
+from services.models import get_whisper_model, init_worker, worker_ready
+from services.profiles import TRANSCRIBE_PROFILE, default_profile, get_profile
+from services.transcript import Transcript, TranscriptBuilder
+from services.whisper_batch import transcribe_batched
+
+logger = logging.getLogger(__name__)
+
+# Pool size, and the knobs for splitting long media across it
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 2))
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", 60))
+TRANSCRIBE_MIN_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_MIN_CHUNK_SECONDS", 30))
+TRANSCRIBE_MAX_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_MAX_CHUNK_SECONDS", 120))
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP", 1.0))
+
+# Above 1, each worker decodes this many silence-cut 30 second windows of its own chunk per CTranslate2
+# call (services/whisper_batch.py) instead of faster-whisper's sequential, context-conditioned decode.
+# Windows of different chunks or requests are never batched together.
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", 1))
+
+# Process pool for CPU-bound tasks; each worker loads the default profile's Whisper model when it starts
+executor = ProcessPoolExecutor(
+    max_workers=TRANSCRIBE_WORKERS, initializer=init_worker,
+    initargs=(default_profile()["model_size"], default_profile()["cpu_threads"])
+)
+
+# Set once every pool worker has started and loaded its model
+workers_ready = False
+# Model load seconds reported by each pool worker, keyed by pid
+worker_load_times = {}
+
+transcriptions = metrics.Counter("transcriptions_total", "Transcriptions started, by profile")
+
+# Chunks handed to the pool and not yet finished, across all transcriptions
+_pool_tasks = set()
+
+# How long the event loop waits on the segment queue before checking the worker is still alive
+QUEUE_POLL_SECONDS = 1.0
+
+_manager = None
+
+
+def get_manager():
+    # Manager queues are picklable, so they can be handed to pool workers
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.Manager()
+    return _manager
+
+
+async def warm_up_workers():
+    """Start every pool worker now, so the first request does not pay for model loading."""
+    global workers_ready
+    loop = asyncio.get_running_loop()
+    start = time.time()
+    if inference.remote_enabled():
+        # The inference service owns the pool; just wait until it reports ready
+        status = await loop.run_in_executor(None, inference.wait_until_ready)
+        worker_load_times.update(status["workers"])
+        workers_ready = True
+        logger.info(f"Inference service (pid {status['pid']}) ready after {time.time() - start:.2f} seconds")
+        return
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, worker_ready) for _ in range(TRANSCRIBE_WORKERS)
+    ))
+    workers_ready = True
+    for result in results:
+        worker_load_times[result["pid"]] = result["load_times"]
+    pids = sorted({result["pid"] for result in results})
+    logger.info(f"Transcription workers {pids} ready in {time.time() - start:.2f} seconds")
+
+
+def transcribe_chunk_to_queue(
+    pcm_path: str, index: int, start: int, stop: int, segment_queue, cancel_event, profile: dict = None
+):
+    """Transcribe samples [start, stop) of the PCM file, pushing segments with absolute times."""
+    count = 0
+    profile = profile or get_profile(TRANSCRIBE_PROFILE)
+    try:
+        if cancel_event.is_set():
+            segment_queue.put(("done", index, count))
+            return
+        # Already 16 kHz mono, so Whisper skips its own decode; the copy only makes the slice writable
+        pcm = np.memmap(pcm_path, dtype=np.float32, mode="r", shape=(stop,))
+        offset = start / SAMPLE_RATE
+        model = get_whisper_model(profile["model_size"], profile["cpu_threads"])
+        samples = np.array(pcm[start:stop])
+        if WHISPER_BATCH_SIZE > 1:
+            segments = transcribe_batched(
+                model, samples, WHISPER_BATCH_SIZE, beam_size=profile["beam_size"], vad_filter=profile["vad_filter"]
+            )
+        else:
+            segments, _ = model.transcribe(
+                samples, language="en", vad_filter=profile["vad_filter"], beam_size=profile["beam_size"]
+            )
+            segments = ((segment.start, segment.end, segment.text) for segment in segments)
+        for segment_start, segment_end, text in segments:
+            if cancel_event.is_set():
+                break
+            segment_queue.put(("segment", index, {
+                "start": offset + segment_start,
+                "end": offset + segment_end,
+                "text": text.strip()
+            }))
+            count += 1
+        segment_queue.put(("done", index, count))
+    except Exception as e:
+        segment_queue.put(("error", index, str(e)))
+
+
+class ChunkPlan:
+    """Chunks handed to the pool so far; grows while the audio is still being decoded."""
+
+    def __init__(self):
+        self.bounds_seconds = [0.0]
+        self.futures = []
+        self.complete = False
+        self.task = None
+
+    @property
+    def chunks(self) -> int:
+        return len(self.futures)
+
+
+async def _plan_chunks(audio: PCMBuffer, plan: ChunkPlan, submit):
+    """Cut the audio at silences as it arrives and submit each chunk once its samples (plus overlap) exist.
+
+    Transcription starts as soon as the first chunk is decoded, even when the pool has a single worker;
+    media no longer than TRANSCRIBE_MAX_CHUNK_SECONDS is one chunk.
+    """
+    overlap = int(TRANSCRIBE_CHUNK_OVERLAP * SAMPLE_RATE)
+    max_samples = int(TRANSCRIBE_MAX_CHUNK_SECONDS * SAMPLE_RATE)
+
+    start = 0
+    while True:
+        available = await audio.wait_for(start + max_samples + overlap + 1)
+        if audio.finished and available - start <= max_samples:
+            break
+        cut = next_split_point(
+            audio.array(start + max_samples), start,
+            TRANSCRIBE_MIN_CHUNK_SECONDS, TRANSCRIBE_MAX_CHUNK_SECONDS, TRANSCRIBE_CHUNK_SECONDS
+        )
+        plan.bounds_seconds.append(cut / SAMPLE_RATE)
+        submit(start, min(available, cut + overlap))
+        start = cut
+
+    total = await audio.wait_finished()
+    if total > start:
+        plan.bounds_seconds.append(total / SAMPLE_RATE)
+        submit(start, total)
+    plan.complete = True
+    logger.info(f"Split {total / SAMPLE_RATE:.2f} seconds of audio from {audio.source} into {plan.chunks} chunks")
+
+
+def _relay_queue(segment_queue, loop, messages: asyncio.Queue, stop: threading.Event):
+    """Move worker messages onto the event loop from a thread of its own, not one of the default executor's."""
+    while not stop.is_set():
+        try:
+            message = segment_queue.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        except (OSError, EOFError):
+            # The manager went away; _drain_queue notices the stalled workers
+            return
+        try:
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+        except RuntimeError:
+            # The event loop has closed
+            return
+
+
+async def _drain_queue(messages: asyncio.Queue, plan: ChunkPlan):
+    """Yield (chunk_index, segment) in chunk order while chunks finish in any order."""
+    buffered = {}
+    done = set()
+    current = 0
+    while not (plan.complete and current >= plan.chunks):
+        try:
+            kind, index, payload = await asyncio.wait_for(messages.get(), QUEUE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            if plan.task.done() and plan.task.exception() is not None:
+                plan.task.result()
+            for future in plan.futures:
+                if future.done() and future.exception() is not None:
+                    future.result()
+            if plan.complete and all(future.done() for future in plan.futures):
+                raise RuntimeError("Transcription worker exited without finishing")
+            continue
+        if kind == "error":
+            raise RuntimeError(payload)
+        if kind == "segment":
+            if index == current:
+                yield index, payload
+            else:
+                buffered.setdefault(index, []).append(payload)
+            continue
+        done.add(index)
+        while current in done:
+            current += 1
+            for segment in buffered.pop(current, []):
+                yield current, segment
+
+
+async def stream_transcription(audio: PCMBuffer, profile: dict = None):
+    """Yield {"start", "end", "text"} segments in timestamp order while the rest is still decoding and transcribing.
+
+    Long media is split at silences and fanned out across the pool as soon as each chunk has been decoded.
+    `profile` comes from services.profiles; the default is TRANSCRIBE_PROFILE.
+    """
+    loop = asyncio.get_running_loop()
+    profile = profile or get_profile(TRANSCRIBE_PROFILE)
+    transcriptions.inc(profile=profile["name"])
+    relay_slots = None
+    if inference.remote_enabled():
+        # Relay threads in this process talk to the inference service, so plain thread primitives do
+        pool, transcribe_chunk = inference.relay_executor, inference.transcribe_chunk_remote
+        segment_queue, cancel_event = queue.Queue(), threading.Event()
+        # A relay thread is held for as long as its chunk runs or waits in the service's pool, so relay
+        # only as many chunks at once as the service has workers; long media cannot fill relay_executor
+        relay_slots = asyncio.Semaphore(TRANSCRIBE_WORKERS)
+    else:
+        manager = get_manager()
+        pool, transcribe_chunk = executor, transcribe_chunk_to_queue
+        segment_queue, cancel_event = manager.Queue(), manager.Event()
+    plan = ChunkPlan()
+
+    async def relay(*args):
+        async with relay_slots:
+            return await loop.run_in_executor(pool, transcribe_chunk, *args)
+
+    def submit(start: int, stop: int):
+        args = (audio.path, plan.chunks, start, stop, segment_queue, cancel_event, profile)
+        if relay_slots is None:
+            future = loop.run_in_executor(pool, transcribe_chunk, *args)
+        else:
+            future = asyncio.ensure_future(relay(*args))
+        _pool_tasks.add(future)
+        future.add_done_callback(_pool_tasks.discard)
+        plan.futures.append(future)
+
+    plan.task = asyncio.create_task(_plan_chunks(audio, plan, submit))
+    messages, relay_stop = asyncio.Queue(), threading.Event()
+    threading.Thread(
+        target=_relay_queue, args=(segment_queue, loop, messages, relay_stop), name="segment-relay", daemon=True
+    ).start()
+    merger = SegmentMerger(plan.bounds_seconds)
+    count = 0
+    start = time.time()
+    try:
+        async for index, segment in _drain_queue(messages, plan):
+            if merger.accept(index, segment):
+                count += 1
+                yield segment
+        elapsed = time.time() - start
+        if elapsed > 0 and audio.duration:
+            metrics.transcription_rtf.observe(audio.duration / elapsed)
+        logger.info(f"Streamed {count} segments from {plan.chunks} chunks for {audio.source} ({profile['name']} profile)")
+    finally:
+        relay_stop.set()
+        # Stop the workers early if the consumer went away
+        plan.task.cancel()
+        if not all(future.done() for future in plan.futures):
+            cancel_event.set()
+            for future in plan.futures:
+                future.cancel()
+
+
+async def collect_transcription(audio: PCMBuffer, on_segment=None, profile: dict = None) -> Transcript:
+    builder = TranscriptBuilder()
+    async for segment in stream_transcription(audio, profile):
+        builder.append(segment)
+        if on_segment is not None:
+            on_segment(segment)
+    return builder.build()
+
+
+@metrics.register_collector
+def collect_pool():
+    in_flight = len(_pool_tasks)
+    return [
+        ("transcribe_pool_workers", "gauge", "Transcription pool processes", [({}, TRANSCRIBE_WORKERS)]),
+        ("transcribe_pool_in_flight", "gauge", "Chunks submitted to the pool and not finished", [({}, in_flight)]),
+        ("transcribe_pool_queued", "gauge", "Chunks waiting for a free pool worker", [({}, max(0, in_flight - TRANSCRIBE_WORKERS))]),
+        ("worker_model_load_seconds", "gauge", "Model load time inside each pool worker", [
+            ({"model": key, "pid": pid}, seconds)
+            for pid, times in worker_load_times.items() for key, seconds in times.items()
+        ]),
+    ]
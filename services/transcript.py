@@ -0,0 +1,107 @@
+import logging
+import re
+from array import array
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_HHMMSS = re.compile(r"^\s*(?:(\d+):)?(\d{1,2}):(\d{1,2}(?:\.\d+)?)\s*$")
+
+
+def seconds_to_hhmmss(seconds: float) -> str:
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def hhmmss_to_seconds(hhmmss: str) -> float:
+    """Parse HH:MM:SS (or MM:SS, with optional fractional seconds); 0 for anything else.
+
+    Hours are unbounded (long videos); minutes and seconds must be below 60.
+    """
+    match = _HHMMSS.match(hhmmss)
+    if not match or int(match.group(2)) >= 60 or float(match.group(3)) >= 60:
+        logger.warning(f"Invalid timestamp format: {hhmmss}")
+        return 0.0
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_segment(segment: dict) -> dict:
+    """API shape of one numeric {"start", "end", "text"} segment."""
+    return {"timestamp": seconds_to_hhmmss(segment["start"]), "text": segment["text"]}
+
+
+class Transcript:
+    """Segments as float64 start/end columns plus a list of texts.
+
+    Times stay in (fractional) seconds through the pipeline; HH:MM:SS strings are only
+    produced by to_items() and lines(), at the API and prompt boundaries.
+    """
+
+    def __init__(self, starts=None, ends=None, texts=None):
+        self.starts = np.asarray(starts if starts is not None else [], dtype=np.float64)
+        self.ends = np.asarray(ends if ends is not None else self.starts, dtype=np.float64)
+        self.texts = list(texts or [])
+
+    @classmethod
+    def from_items(cls, items) -> "Transcript":
+        """Build from API items that only carry an HH:MM:SS timestamp and text."""
+        starts = [hhmmss_to_seconds(item.timestamp) for item in items]
+        return cls(starts, starts, [item.text.strip() for item in items])
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Transcript":
+        return cls(data["start"], data["end"], data["text"])
+
+    def to_dict(self) -> dict:
+        return {"start": self.starts.tolist(), "end": self.ends.tolist(), "text": self.texts}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def sorted(self) -> "Transcript":
+        """This transcript in start-time order (itself when already ordered, as Whisper output is)."""
+        if len(self) < 2 or np.all(np.diff(self.starts) >= 0):
+            return self
+        order = np.argsort(self.starts, kind="stable")
+        return Transcript(self.starts[order], self.ends[order], [self.texts[i] for i in order])
+
+    def lines(self) -> list:
+        return [f"{seconds_to_hhmmss(start)} {text}" for start, text in zip(self.starts.tolist(), self.texts)]
+
+    def to_items(self) -> list:
+        return [
+            {"timestamp": seconds_to_hhmmss(start), "text": text}
+            for start, text in zip(self.starts.tolist(), self.texts)
+        ]
+
+
+class TranscriptBuilder:
+    """Appends segments into compact typed arrays while transcription is still running."""
+
+    def __init__(self):
+        self._starts = array("d")
+        self._ends = array("d")
+        self._texts = []
+
+    def append(self, segment):
+        if isinstance(segment, dict):
+            start, end, text = segment["start"], segment["end"], segment["text"]
+        else:
+            start, end, text = segment.start, segment.end, segment.text
+        self._starts.append(start)
+        self._ends.append(end)
+        self._texts.append(text.strip())
+
+    def __len__(self):
+        return len(self._texts)
+
+    def build(self) -> Transcript:
+        return Transcript(
+            np.frombuffer(self._starts, dtype=np.float64).copy(),
+            np.frombuffer(self._ends, dtype=np.float64).copy(),
+            self._texts
+        )
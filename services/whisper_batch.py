@@ -0,0 +1,107 @@
+"""Intra-chunk batched Whisper decoding: the windows of one chunk, decoded together (opt-in via WHISPER_BATCH_SIZE).
+
+faster-whisper decodes one 30 second window at a time, each conditioned on the previous one. Here a
+chunk is cut at silences into windows of at most 30 seconds, and up to WHISPER_BATCH_SIZE of them go
+through one CTranslate2 encode/generate call, which keeps far more of the CPU busy per step. Windows
+are decoded without the previous text as prompt, which costs a little accuracy at window edges.
+
+This is not cross-request batching. Each pool worker owns its model and runs one chunk at a time, so
+windows from concurrent jobs never share a generate call; concurrent jobs share the CPU by running
+their chunks on different workers. Only sentence embeddings are batched across requests
+(services/batching.py).
+"""
+import logging
+
+import numpy as np
+
+from services.chunking import SAMPLE_RATE, next_split_point
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 30.0
+MIN_WINDOW_SECONDS = 20.0
+# Seconds per timestamp token
+TIME_PRECISION = 0.02
+# Same cut-offs faster-whisper uses to drop windows that are most likely silence
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+
+
+def split_windows(audio: np.ndarray) -> list:
+    """(start, stop) sample ranges of at most WINDOW_SECONDS, cut at the quietest point near the end."""
+    windows = []
+    start = 0
+    max_samples = int(WINDOW_SECONDS * SAMPLE_RATE)
+    while len(audio) - start > max_samples:
+        cut = next_split_point(audio, start, MIN_WINDOW_SECONDS, WINDOW_SECONDS, WINDOW_SECONDS, SAMPLE_RATE)
+        windows.append((start, cut))
+        start = cut
+    if len(audio) > start:
+        windows.append((start, len(audio)))
+    return windows
+
+
+def _split_by_timestamps(tokenizer, tokens: list, duration: float) -> list:
+    """Turn <|t0|> text <|t1|><|t1|> text ... token ids into (start, end, text) relative to the window."""
+    segments = []
+    start, text = 0.0, []
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            time = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if text:
+                segments.append((start, min(time, duration), tokenizer.decode(text).strip()))
+                text = []
+            start = time
+        elif token < tokenizer.eot:
+            text.append(token)
+    if text:
+        segments.append((start, duration, tokenizer.decode(text).strip()))
+    return [segment for segment in segments if segment[2]]
+
+
+def transcribe_batched(
+    model, audio: np.ndarray, batch_size: int, beam_size: int = 5, language: str = "en", vad_filter: bool = False
+):
+    """Yield (start, end, text) in seconds relative to `audio`, decoding batch_size windows per generate call.
+
+    With vad_filter, only the speech Silero VAD finds is windowed and decoded, as in model.transcribe.
+    """
+    import ctranslate2
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+
+    speech_map = None
+    if vad_filter:
+        from faster_whisper.vad import SpeechTimestampsMap, collect_chunks, get_speech_timestamps
+
+        speech_chunks = get_speech_timestamps(audio)
+        audio = collect_chunks(audio, speech_chunks)
+        speech_map = SpeechTimestampsMap(speech_chunks, SAMPLE_RATE)
+
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language)
+    prompt = list(tokenizer.sot_sequence)
+    frames = model.feature_extractor.nb_max_frames
+    windows = split_windows(audio)
+    for first in range(0, len(windows), batch_size):
+        group = windows[first:first + batch_size]
+        features = np.stack([
+            pad_or_trim(model.feature_extractor(audio[start:stop]), frames) for start, stop in group
+        ]).astype(np.float32)
+        encoded = model.model.encode(ctranslate2.StorageView.from_array(np.ascontiguousarray(features)))
+        results = model.model.generate(
+            encoded, [prompt] * len(group), beam_size=beam_size, max_length=model.max_length,
+            return_scores=True, return_no_speech_prob=True, suppress_blank=True, suppress_tokens=[-1],
+        )
+        for (start, stop), result in zip(group, results):
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.scores[0] < LOG_PROB_THRESHOLD:
+                continue
+            offset = start / SAMPLE_RATE
+            for segment_start, segment_end, text in _split_by_timestamps(
+                tokenizer, result.sequences_ids[0], (stop - start) / SAMPLE_RATE
+            ):
+                segment_start, segment_end = offset + segment_start, offset + segment_end
+                if speech_map is not None:
+                    # Back from the speech-only timeline to the chunk's own
+                    segment_start = speech_map.get_original_time(segment_start)
+                    segment_end = speech_map.get_original_time(segment_end)
+                yield segment_start, segment_end, text
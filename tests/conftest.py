@@ -0,0 +1,94 @@
+"""Shared fixtures. Tests run offline: the LLM is the stub client, and media decoding, Whisper and the
+sentence model are replaced at the pipeline seams, so no ffmpeg, models or API keys are needed.
+
+Run from the repository root: python -m pytest
+"""
+import os
+import tempfile
+
+_WORK_DIR = tempfile.mkdtemp(prefix="tests-")
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("LLM_CACHE_TTL", "0")
+os.environ.setdefault("RESULT_CACHE_MAX_AGE", "0")
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_WORK_DIR, "results"))
+os.environ.setdefault("EMBEDDING_CACHE_DIR", os.path.join(_WORK_DIR, "embeddings"))
+os.environ.setdefault("WARM_UP_MODELS", "0")
+
+import asyncio
+import re
+
+import numpy as np
+import pytest
+
+SEGMENT_SECONDS = 10.0
+
+
+class FakeAudio:
+    """Stands in for a PCMBuffer whose decoding has already finished."""
+
+    def __init__(self, source: str, duration: float):
+        self.source = source
+        self.duration = duration
+        self.expected_duration = None
+        self.finished = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def fake_embeddings(texts: list) -> np.ndarray:
+    """Deterministic unit-length bag-of-words vectors, so identical wording scores highest."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vectors[row, sum(map(ord, word)) % 64] += 1.0
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+@pytest.fixture
+def fake_media(monkeypatch):
+    """Uploads decode to FakeAudio and transcribe to one "Topic N is discussed here." segment per 10 seconds."""
+    import routes.batch
+    import routes.mapping
+    import routes.upload
+    from services.transcript import TranscriptBuilder
+
+    state = {"duration": 60.0, "audio": []}
+
+    async def decode_upload(file):
+        audio = FakeAudio(file.filename, state["duration"])
+        state["audio"].append(audio)
+        return audio
+
+    async def decode_fd(fd, source):
+        audio = FakeAudio(source, state["duration"])
+        state["audio"].append(audio)
+        return audio
+
+    async def collect_transcription(audio, on_segment=None, profile=None):
+        builder = TranscriptBuilder()
+        for i in range(int(audio.duration // SEGMENT_SECONDS)):
+            segment = {"start": i * SEGMENT_SECONDS, "end": (i + 1) * SEGMENT_SECONDS, "text": f"Topic {i} is discussed here."}
+            builder.append(segment)
+            if on_segment is not None:
+                on_segment(segment)
+            # Let the event loop deliver events between segments, as a real transcription would
+            await asyncio.sleep(0.01)
+        return builder.build()
+
+    monkeypatch.setattr(routes.upload, "decode_upload", decode_upload)
+    monkeypatch.setattr(routes.batch, "decode_fd", decode_fd)
+    monkeypatch.setattr(routes.upload, "collect_transcription", collect_transcription)
+    monkeypatch.setattr(routes.mapping, "encode_texts", fake_embeddings)
+    return state
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
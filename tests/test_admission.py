@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, Overloaded, Stage
+
+
+def test_saturated_stage_answers_503_with_retry_after():
+    async def run():
+        stage = Stage("transcribe", concurrency=1, max_waiting=1, expected_seconds=30.0)
+        release = asyncio.Event()
+
+        async def hold():
+            async with stage.slot():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        waiting = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (stage.active, stage.waiting) == (1, 1)
+        with pytest.raises(Overloaded) as error:
+            async with stage.slot():
+                pass
+        release.set()
+        await asyncio.gather(running, waiting)
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    # One running and one waiting call, 30 s each on one slot
+    assert error.headers["Retry-After"] == "60"
+    assert error.detail == {"message": "transcribe stage is saturated", "queue_depth": 1, "retry_after": 60}
+
+
+def test_pending_limit_answers_429_until_a_slot_is_released():
+    admission = AdmissionController(max_pending=1)
+    release = admission.reserve()
+    with pytest.raises(Overloaded) as error:
+        admission.reserve()
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+    release()
+    release()
+    assert admission.pending == 0
+    admission.reserve()
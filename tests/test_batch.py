@@ -0,0 +1,53 @@
+import json
+import uuid
+
+import pytest
+
+from services.admission import admission
+
+
+def run_batch(client, count: int) -> list:
+    files = [("files", (f"talk{i}.mp4", uuid.uuid4().bytes, "video/mp4")) for i in range(count)]
+    response = client.post("/api/upload/batch", files=files)
+    return [json.loads(line) for line in response.text.strip().splitlines()]
+
+
+@pytest.fixture
+def pending_at_transcription(fake_media, monkeypatch):
+    """admission.pending seen as each item starts transcribing."""
+    import routes.upload
+
+    pending = []
+    collect_transcription = routes.upload.collect_transcription
+
+    async def recording_transcription(audio, on_segment=None, profile=None):
+        pending.append(admission.pending)
+        return await collect_transcription(audio, on_segment, profile)
+
+    monkeypatch.setattr(routes.upload, "collect_transcription", recording_transcription)
+    return pending
+
+
+def test_each_batch_item_holds_its_own_admission_slot(client, pending_at_transcription):
+    lines = run_batch(client, 5)
+    assert lines[-1]["completed"] == 5
+    # Items in flight together are counted separately
+    assert max(pending_at_transcription) > 1
+    assert admission.pending == 0
+
+
+def test_batch_items_wait_for_free_slots(client, pending_at_transcription, monkeypatch):
+    monkeypatch.setattr(admission, "max_pending", 2)
+    lines = run_batch(client, 5)
+    assert lines[-1]["status"] == "finished"
+    assert lines[-1]["completed"] == 5
+    assert len(pending_at_transcription) == 5
+    assert max(pending_at_transcription) <= 2
+    assert admission.pending == 0
+
+
+def test_batch_is_rejected_when_no_slot_is_free(client, fake_media, monkeypatch):
+    monkeypatch.setattr(admission, "max_pending", 0)
+    response = client.post("/api/upload/batch", files=[("files", ("talk.mp4", uuid.uuid4().bytes, "video/mp4"))])
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
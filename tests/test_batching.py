@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from services.batching import MicroBatcher
+
+
+def test_concurrent_callers_share_one_batch():
+    runs = []
+    all_submitted = threading.Barrier(4)
+
+    def run_batch(items):
+        runs.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher("test", run_batch, max_items=100, max_delay=0.5)
+    results = {}
+
+    def caller(name, items):
+        all_submitted.wait()
+        results[name] = batcher.submit(items)
+
+    threads = [threading.Thread(target=caller, args=(i, [i, i + 100])) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    # One run for all four callers, each getting back its own slice in order
+    assert len(runs) == 1 and sorted(runs[0]) == sorted(item for i in range(4) for item in (i, i + 100))
+    assert results == {i: [i * 10, (i + 100) * 10] for i in range(4)}
+
+
+def test_batches_are_cut_at_max_items_and_errors_reach_every_caller():
+    runs = []
+
+    def run_batch(items):
+        runs.append(len(items))
+        if "bad" in items:
+            raise ValueError("bad item")
+        return items
+
+    batcher = MicroBatcher("test", run_batch, max_items=3, max_delay=0.05)
+    assert batcher.submit(["a", "b", "c", "d"]) == ["a", "b", "c", "d"]
+    with pytest.raises(ValueError):
+        batcher.submit(["bad"])
+    assert runs == [4, 1]
+
+
+def test_zero_delay_runs_inline():
+    caller = threading.current_thread()
+    batcher = MicroBatcher("test", lambda items: [threading.current_thread() is caller] * len(items), 10, 0)
+    assert batcher.submit([1, 2]) == [True, True]
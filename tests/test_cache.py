@@ -0,0 +1,29 @@
+import os
+
+from services.cache import DiskStore
+
+
+def stored_bytes(directory) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".json"))
+
+
+def test_disk_store_only_scans_when_the_running_total_crosses_the_limit(tmp_path, monkeypatch):
+    store = DiskStore(str(tmp_path), max_bytes=1000)
+    scans = []
+    evict = store.evict
+    monkeypatch.setattr(store, "evict", lambda: scans.append(1) or evict())
+
+    # 10 entries of about 50 bytes: one scan to learn the starting size, none after
+    for i in range(10):
+        store.put(f"key {i}", "x" * 48)
+    store.put("key 0", "y" * 48)
+    assert len(scans) == 1
+    assert store._bytes == stored_bytes(tmp_path)
+
+    # Crossing the limit scans and evicts the oldest entries until the store fits
+    for i in range(10, 30):
+        store.put(f"key {i}", "x" * 48)
+    assert 1 < len(scans) < 20
+    assert stored_bytes(tmp_path) <= 1000
+    assert store.get("key 29") == "x" * 48
+    assert store.get("key 1") is None
@@ -0,0 +1,117 @@
+from services.captions import check_quality, parse_vtt, pick_track
+
+# YouTube automatic captions: every cue repeats the line above, with inline word timings,
+# a 10 ms cue holds the finished line on screen between them, and lines holding a single space (\x20) sit inside cues
+AUTOMATIC_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.500 align:start position:0%
+\x20
+hello<00:00:00.500><c> everyone</c><00:00:01.000><c> and</c>
+
+00:00:02.500 --> 00:00:02.510 align:start position:0%
+hello everyone and
+\x20
+
+00:00:02.510 --> 00:00:05.000 align:start position:0%
+hello everyone and
+welcome<00:00:03.000><c> to</c><00:00:03.500><c> the</c><00:00:04.000><c> talk</c>
+
+00:00:05.000 --> 00:00:05.010 align:start position:0%
+welcome to the talk
+\x20
+
+00:00:05.010 --> 00:00:08.000 align:start position:0%
+welcome to the talk
+on<00:00:05.500><c> caching</c><00:00:06.000><c> &amp;</c><00:00:06.500><c> queues</c>
+"""
+
+UPLOADER_VTT = """WEBVTT
+
+NOTE written by the uploader
+
+1
+00:00:01.000 --> 00:00:04.000
+<v Speaker>Hello everyone,</v>
+and welcome.
+
+2
+00:01:04.000 --> 00:01:08.500
+Today we talk about caching.
+"""
+
+MUSIC_VTT = """WEBVTT
+
+00:00:00.000 --> 00:00:30.000
+[Music]
+
+00:00:30.000 --> 00:01:00.000
+(applause)
+
+00:01:00.000 --> 00:01:30.000
+[Music]
+
+00:01:30.000 --> 00:01:35.000
+thank you
+"""
+
+
+def speech(end: float, words: int) -> list:
+    """One cue per 10 s up to `end`, carrying `words` words in total."""
+    cues = int(end // 10)
+    return [
+        {"start": i * 10.0, "end": (i + 1) * 10.0, "text": " ".join(["word"] * (words // cues))}
+        for i in range(cues)
+    ]
+
+
+def test_rolling_automatic_captions_keep_only_new_lines():
+    segments = parse_vtt(AUTOMATIC_VTT)
+    assert segments == [
+        {"start": 0.0, "end": 2.5, "text": "hello everyone and"},
+        {"start": 2.51, "end": 5.0, "text": "welcome to the talk"},
+        {"start": 5.01, "end": 8.0, "text": "on caching & queues"},
+    ]
+
+
+def test_inline_tags_and_cue_identifiers_are_stripped():
+    segments = parse_vtt(UPLOADER_VTT.replace("\n", "\r\n"))
+    assert [segment["text"] for segment in segments] == ["Hello everyone, and welcome.", "Today we talk about caching."]
+    assert [(segment["start"], segment["end"]) for segment in segments] == [(1.0, 4.0), (64.0, 68.5)]
+    assert all("<" not in segment["text"] for segment in parse_vtt(AUTOMATIC_VTT))
+
+
+def test_music_only_tracks_are_rejected():
+    segments = parse_vtt(MUSIC_VTT)
+    assert len(segments) == 4
+    assert check_quality(segments) == "3 of 4 cues are non-speech"
+    assert check_quality([]) == "no cues"
+
+
+def test_coverage_and_words_per_minute_gates():
+    # 10 minutes of captions at 120 words per minute
+    assert check_quality(speech(600, 1200), duration=600) is None
+    # The captions stop at half the video
+    assert check_quality(speech(300, 600), duration=600) == "captions end at 300s of 600s"
+    # Covers the video but is too sparse to be a transcript
+    assert check_quality(speech(600, 120), duration=600) == "only 12 words per minute"
+    # Without a known duration the last cue sets the span
+    assert check_quality(speech(600, 1200)) is None
+
+
+def test_uploader_tracks_win_over_automatic_captions():
+    info = {
+        "subtitles": {
+            "de": [{"ext": "vtt", "url": "https://example.com/de.vtt"}],
+            "en-GB": [{"ext": "srv3", "url": "https://example.com/en-GB.srv3"}, {"ext": "vtt", "url": "https://example.com/en-GB.vtt"}],
+        },
+        "automatic_captions": {"en": [{"ext": "vtt", "url": "https://example.com/auto-en.vtt"}]},
+    }
+    assert pick_track(info) == ("en-GB", "https://example.com/en-GB.vtt", False)
+
+    # Only automatic captions in a listed language
+    info["subtitles"].pop("en-GB")
+    assert pick_track(info) == ("en", "https://example.com/auto-en.vtt", True)
+    assert pick_track(info, allow_automatic=False) is None
+    assert pick_track({}) is None
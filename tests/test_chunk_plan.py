@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+
+from services.audio import PCMBuffer
+from services.chunking import SAMPLE_RATE
+from services.transcriber import TRANSCRIBE_MAX_CHUNK_SECONDS, ChunkPlan, _plan_chunks
+
+
+def feed(buffer: PCMBuffer, seconds: float):
+    """Append `seconds` of quiet noise, as the ffmpeg pump would."""
+    data = np.random.default_rng(0).normal(0, 0.01, int(seconds * SAMPLE_RATE)).astype(np.float32).tobytes()
+    buffer._write(data)
+    buffer._bytes += len(data)
+    buffer._notify()
+
+
+def finish(buffer: PCMBuffer):
+    buffer._file.close()
+    buffer.finished = True
+    buffer._notify()
+
+
+async def plan_while_decoding(total_seconds: float, step_seconds: float = 30.0):
+    buffer = PCMBuffer("test")
+    plan = ChunkPlan()
+    submitted = []
+    plan.futures = submitted
+    decoded_when_first_submitted = []
+
+    def submit(start: int, stop: int):
+        if not submitted:
+            decoded_when_first_submitted.append(buffer.finished)
+        submitted.append((start, stop))
+
+    try:
+        task = asyncio.create_task(_plan_chunks(buffer, plan, submit))
+        fed = 0.0
+        while fed < total_seconds:
+            feed(buffer, min(step_seconds, total_seconds - fed))
+            fed += step_seconds
+            await asyncio.sleep(0)
+        finish(buffer)
+        await task
+    finally:
+        buffer.close()
+    return plan, submitted, decoded_when_first_submitted
+
+
+def test_first_chunk_is_transcribed_while_decoding_continues():
+    plan, submitted, decoded = asyncio.run(plan_while_decoding(250))
+    assert plan.complete
+    assert decoded == [False]
+    assert len(submitted) > 1
+    assert submitted[0][0] == 0 and submitted[-1][1] == 250 * SAMPLE_RATE
+    assert all(stop - start <= (TRANSCRIBE_MAX_CHUNK_SECONDS + 1) * SAMPLE_RATE for start, stop in submitted)
+    assert plan.bounds_seconds[0] == 0.0 and plan.bounds_seconds[-1] == 250.0
+
+
+def test_short_media_is_one_chunk():
+    plan, submitted, _ = asyncio.run(plan_while_decoding(90))
+    assert submitted == [(0, 90 * SAMPLE_RATE)]
+    assert plan.bounds_seconds == [0.0, 90.0]
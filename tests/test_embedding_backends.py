@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from services import embedding_backends
+
+
+def test_failed_export_is_recorded_and_not_retried(tmp_path):
+    directory = str(tmp_path / "model")
+    loads = []
+
+    def load_torch_model():
+        loads.append(1)
+        raise RuntimeError("torch is not installed")
+
+    with pytest.raises(RuntimeError, match="torch is not installed"):
+        embedding_backends.load_onnx(directory, load_torch_model)
+    assert os.path.exists(directory + embedding_backends.FAILURE_SUFFIX)
+    assert not os.path.exists(directory)
+
+    with pytest.raises(RuntimeError, match="failed earlier"):
+        embedding_backends.load_onnx(directory, load_torch_model)
+    assert len(loads) == 1
+
+
+def test_embedding_caches_are_separate_per_backend():
+    from services.embedding_cache import get_embedding_cache
+
+    assert get_embedding_cache("torch") is get_embedding_cache("torch")
+    assert get_embedding_cache("torch").directory != get_embedding_cache("onnx-int8").directory
+
+
+def test_the_export_does_not_keep_the_pytorch_model_loaded(monkeypatch):
+    from services import models
+
+    loaders = []
+
+    def fake_load_onnx(directory, load_torch_model):
+        loaders.append(load_torch_model)
+        return "onnx backend"
+
+    monkeypatch.setattr(models, "_models", {})
+    monkeypatch.setattr(models, "EMBEDDING_BACKEND", "onnx")
+    monkeypatch.setattr(models, "load_onnx", fake_load_onnx)
+    assert models.get_embedding_backend() == "onnx backend"
+    assert loaders == [models.load_sentence_model]
+    assert not models.is_loaded("sentence:")
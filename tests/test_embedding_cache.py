@@ -0,0 +1,61 @@
+import numpy as np
+
+from services.embedding_cache import EmbeddingCache
+
+
+def encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[float(len(text)), float(sum(map(ord, text)))] for text in texts], dtype=np.float32)
+
+    return encode
+
+
+def test_other_processes_pick_up_writes_and_evictions(tmp_path):
+    # Two instances on one directory stand in for two processes
+    writer, reader = EmbeddingCache(str(tmp_path), capacity=4), EmbeddingCache(str(tmp_path), capacity=4)
+    calls = []
+    expected = encoder([])(["a", "bb", "ccc"])
+
+    assert np.array_equal(writer.encode(["a", "bb", "ccc"], encoder(calls)), expected)
+    assert np.array_equal(reader.encode(["a", "bb", "ccc"], encoder(calls)), expected)
+    assert len(calls) == 1
+
+    # Filling the cache evicts "a", the least recently used text
+    writer.encode(["a"], encoder(calls))
+    writer.encode(["bb", "ccc"], encoder(calls))
+    writer.encode(["dddd", "eeeee"], encoder(calls))
+    calls.clear()
+    assert np.array_equal(reader.encode(["bb", "dddd", "eeeee"], encoder(calls)), encoder([])(["bb", "dddd", "eeeee"]))
+    assert calls == []
+    reader.encode(["a"], encoder(calls))
+    assert calls == [["a"]]
+
+
+def test_a_slot_rewritten_during_a_read_is_a_miss(tmp_path):
+    writer, reader = EmbeddingCache(str(tmp_path), capacity=4), EmbeddingCache(str(tmp_path), capacity=4)
+    calls = []
+    writer.encode(["hello"], encoder(calls))
+    reader.encode(["hello"], encoder(calls))
+    assert len(calls) == 1
+
+    # The writer has started replacing the slot but not bumped the generation yet
+    slot = writer._slots[next(iter(writer._slots))][0]
+    writer._seq[slot] = -1
+    writer._vectors[slot] = 0.0
+    assert np.array_equal(reader.encode(["hello"], encoder(calls)), encoder([])(["hello"]))
+    assert len(calls) == 2
+
+
+def test_a_fresh_reader_only_indexes_occupied_slots(tmp_path, monkeypatch):
+    writer = EmbeddingCache(str(tmp_path), capacity=200000)
+    writer.encode(["one", "two"], encoder([]))
+
+    reader = EmbeddingCache(str(tmp_path), capacity=200000)
+    forgotten = []
+    forget = reader._forget
+    monkeypatch.setattr(reader, "_forget", lambda slot: forgotten.append(slot) or forget(slot))
+    calls = []
+    reader.encode(["one", "two"], encoder(calls))
+    assert calls == []
+    assert sorted(forgotten) == sorted(slot for slot, _ in writer._slots.values())
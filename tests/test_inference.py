@@ -0,0 +1,55 @@
+import os
+import socket
+import stat
+import time
+from multiprocessing.connection import AuthenticationError, Client
+
+import pytest
+
+from services import inference
+
+
+@pytest.fixture
+def service(tmp_path):
+    """A standalone service without INFERENCE_AUTHKEY, so it generates its own key."""
+    address = str(tmp_path / "run" / "inference.sock")
+    process = inference.start_service(address, None)
+    deadline = time.time() + 30
+    while not os.path.exists(address) and time.time() < deadline:
+        time.sleep(0.05)
+    yield address
+    process.terminate()
+    process.join(10)
+
+
+def ping(address: str, authkey: bytes) -> dict:
+    with Client(address, family="AF_UNIX", authkey=authkey) as conn:
+        conn.send(("ping",))
+        return conn.recv()
+
+
+def test_service_generates_a_private_authkey(service):
+    key_path = inference.key_path(service)
+    assert stat.S_IMODE(os.stat(key_path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(service)).st_mode) == 0o700
+    with open(key_path, "rb") as f:
+        status, payload = ping(service, f.read())
+    assert status == "ok" and payload["pid"] > 0
+
+
+def test_bad_or_silent_clients_do_not_block_the_service(service):
+    with open(inference.key_path(service), "rb") as f:
+        authkey = f.read()
+    with pytest.raises(AuthenticationError):
+        ping(service, b"wrong key")
+
+    # Connects and never answers the challenge
+    silent = socket.socket(socket.AF_UNIX)
+    silent.connect(service)
+    try:
+        start = time.time()
+        assert ping(service, authkey)[0] == "ok"
+        assert time.time() - start < inference.AUTH_TIMEOUT_SECONDS
+    finally:
+        silent.close()
+    assert ping(service, authkey)[0] == "ok"
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+import uuid
+
+from services.jobs import JOB_MAX_EVENTS, Job
+
+
+def upload(content: bytes = None) -> dict:
+    # Fresh bytes per call, so the result cache never answers for an earlier test
+    return {"file": ("talk.mp4", content or uuid.uuid4().bytes, "video/mp4")}
+
+
+def wait_for_job(client, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout} seconds")
+
+
+def read_sse(response) -> list:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append({"id": int(fields["id"]), "event": fields["event"], **json.loads(fields["data"])})
+    return events
+
+
+def test_job_runs_to_completion(client, fake_media):
+    response = client.post("/api/jobs", files=upload())
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "completed", job.get("error")
+    assert job["progress"] == 100
+    assert job["result"]["source"] == "talk.mp4"
+    assert job["result"]["mapped_data"]
+    assert all(audio.closed for audio in fake_media["audio"])
+
+    events = read_sse(client.get(f"/api/jobs/{job_id}/events"))
+    assert [event["id"] for event in events] == list(range(len(events)))
+    stages = [event["stage"] for event in events if event["event"] == "progress"]
+    assert stages[0] == "transcription" and "summarization" in stages and "mapping" in stages
+    assert sum(1 for event in events if "segment" in event) == 6
+    assert events[-1]["event"] == "completed"
+    assert events[-1]["result"] == job["result"]
+
+    resumed = read_sse(client.get(f"/api/jobs/{job_id}/events", params={"since": len(events) - 1}))
+    assert [event["event"] for event in resumed] == ["completed"]
+
+    cancel = client.delete(f"/api/jobs/{job_id}")
+    assert cancel.status_code == 409
+
+
+def test_job_can_be_cancelled(client, fake_media):
+    # Long enough that the job is still transcribing when the cancellation arrives
+    fake_media["duration"] = 3600.0
+    job_id = client.post("/api/jobs", files=upload()).json()["job_id"]
+
+    cancel = client.delete(f"/api/jobs/{job_id}")
+    assert cancel.status_code == 200
+    assert cancel.json()["status"] == "cancelling"
+    assert wait_for_job(client, job_id)["status"] == "cancelled"
+    assert all(audio.closed for audio in fake_media["audio"])
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.delete("/api/jobs/missing").status_code == 404
+
+
+def test_job_needs_a_source(client):
+    assert client.post("/api/jobs", data={"profile": "fast"}).status_code == 400
+
+
+def test_event_history_is_capped():
+    async def run():
+        job = Job("capped", "talk.mp4")
+        for i in range(JOB_MAX_EVENTS * 3):
+            job.report("transcription", 5, segment={"timestamp": "00:00:00", "text": f"segment {i}"})
+        job.status = "completed"
+        job.publish("completed", result={})
+        assert len(job.events) == JOB_MAX_EVENTS
+        return [event async for event in job.stream(0)]
+
+    events = asyncio.run(run())
+    assert len(events) == JOB_MAX_EVENTS
+    assert [event["seq"] for event in events] == list(range(2 * JOB_MAX_EVENTS + 1, 3 * JOB_MAX_EVENTS + 1))
+    assert events[-1]["type"] == "completed"
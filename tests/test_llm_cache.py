@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import services.llm
+import services.llm_cache
+from services.llm import LLMClient
+from services.llm_cache import generate_cached
+
+
+class CountingClient(LLMClient):
+    """Counts upstream calls and holds each one until `release` is set."""
+
+    model_name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        self.started.set()
+        await self.release.wait()
+        return f"answer to {prompt}"
+
+
+@pytest.fixture
+def counting(monkeypatch):
+    monkeypatch.setattr(services.llm, "_client", None)
+    monkeypatch.setattr(services.llm_cache, "stats", {"hits": 0, "misses": 0, "coalesced": 0})
+
+    def install() -> CountingClient:
+        # Created inside the running loop, so its events bind to it
+        client = CountingClient()
+        services.llm.set_llm_client(client)
+        return client
+
+    return install
+
+
+def test_identical_concurrent_prompts_share_one_call(counting):
+    async def run():
+        client = counting()
+        tasks = [asyncio.create_task(generate_cached("prompt", "v1")) for _ in range(5)]
+        await client.started.wait()
+        await asyncio.sleep(0)
+        client.release.set()
+        return client, await asyncio.gather(*tasks)
+
+    client, answers = asyncio.run(run())
+    assert client.calls == 1
+    assert answers == ["answer to prompt"] * 5
+    assert services.llm_cache.stats["coalesced"] == 4
+    assert not services.llm_cache._in_flight
+
+
+def test_followers_finish_when_the_leader_is_cancelled(counting):
+    async def run():
+        client = counting()
+        leader = asyncio.create_task(generate_cached("prompt", "v1"))
+        await client.started.wait()
+        followers = [asyncio.create_task(generate_cached("prompt", "v1")) for _ in range(4)]
+        await asyncio.sleep(0)
+        client.started.clear()
+        leader.cancel()
+        # Wait for a follower to take over, and the others to join it, before answering
+        await client.started.wait()
+        await asyncio.sleep(0)
+        client.release.set()
+        answers = await asyncio.wait_for(asyncio.gather(*followers), 5)
+        return client, leader, answers
+
+    client, leader, answers = asyncio.run(run())
+    assert leader.cancelled()
+    assert answers == ["answer to prompt"] * 4
+    # One follower took over as leader; the rest joined its call
+    assert client.calls == 2
+    assert not services.llm_cache._in_flight
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import services.llm
+from services.llm import LLMClient, LLMPool, RateLimited, TokenBucket
+
+
+class FakeClock:
+    """Stands in for the time module inside services.llm; sleeping there advances it instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeAsyncio:
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.slept = []
+
+    async def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.clock.now += seconds
+        await asyncio.sleep(0)
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+
+class ScriptedClient(LLMClient):
+    """Answers with its index, or raises RateLimited for the first `rate_limited` calls."""
+
+    model_name = "scripted"
+
+    def __init__(self, index: int, rate_limited: int = 0):
+        self.index = index
+        self.rate_limited = rate_limited
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.calls <= self.rate_limited:
+            raise RateLimited("429 Resource has been exhausted")
+        return f"key {self.index}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    fake_asyncio = FakeAsyncio(clock)
+    monkeypatch.setattr(services.llm, "time", clock)
+    monkeypatch.setattr(services.llm, "asyncio", fake_asyncio)
+    # The lower end of every jittered cooldown
+    monkeypatch.setattr(services.llm.random, "uniform", lambda low, high: low)
+    clock.slept = fake_asyncio.slept
+    return clock
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(15, 15)
+    bucket.consume(15)
+    assert bucket.wait_time(1) == pytest.approx(4.0)
+    clock.now += 2
+    assert bucket.wait_time(1) == pytest.approx(2.0)
+    clock.now += 600
+    assert bucket.fraction() == 1.0
+
+
+def test_calls_spread_over_keys_then_wait_for_rpm(clock):
+    clients = [ScriptedClient(0), ScriptedClient(1)]
+    pool = LLMPool(clients, rpm=2, tpm=1000000)
+
+    async def run():
+        return [await pool.generate("prompt") for _ in range(5)]
+
+    answers = asyncio.run(run())
+    assert sorted(answers[:4]) == ["key 0", "key 0", "key 1", "key 1"]
+    # Both keys spent their 2 requests per minute; the fifth waited for one to refill (30 s at 2 RPM)
+    assert clock.slept and sum(clock.slept) == pytest.approx(30.01)
+    assert [client.calls for client in clients] in ([3, 2], [2, 3])
+
+
+def test_tpm_budget_limits_large_prompts(clock):
+    pool = LLMPool([ScriptedClient(0)], rpm=100, tpm=2000)
+
+    async def run():
+        await pool.generate("x" * 4000)
+        await pool.generate("x" * 4000)
+
+    asyncio.run(run())
+    # Each call needs about 1500 tokens of a 2000 tokens/minute budget
+    assert sum(clock.slept) > 20
+
+
+def test_rate_limited_key_cools_down_and_the_call_fails_over(clock):
+    clients = [ScriptedClient(0, rate_limited=1), ScriptedClient(1)]
+    pool = LLMPool(clients, rpm=10, tpm=1000000)
+    # Make key 0 the first choice
+    pool.slots[1].requests.consume(5)
+
+    answer = asyncio.run(pool.generate("prompt"))
+    assert answer == "key 1"
+    first = pool.slots[0]
+    assert first.rate_limited == 1
+    assert first.cooldown_until == pytest.approx(clock.now + services.llm.LLM_BACKOFF_BASE / 2)
+    assert pool.metrics()["0"]["cooling_down"]
+
+
+def test_repeated_429s_back_off_exponentially_then_give_up(clock):
+    client = ScriptedClient(0, rate_limited=100)
+    pool = LLMPool([client], rpm=1000, tpm=1000000, max_retries=2)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(pool.generate("prompt"))
+    assert error.value.status_code == 429
+    assert client.calls == 3
+    # Cooldowns of base/2, base, 2 * base (the jitter's lower end), waited out between attempts
+    base = services.llm.LLM_BACKOFF_BASE
+    assert sum(clock.slept) == pytest.approx(base / 2 + base + 2 * 0.01, abs=0.02)
+    assert pool.slots[0].consecutive_429s == 3
+
+
+def test_llm_client_requires_generate():
+    with pytest.raises(TypeError):
+        LLMClient()
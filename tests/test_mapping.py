@@ -0,0 +1,36 @@
+import numpy as np
+
+from routes.mapping import score_key_points
+
+
+def masked_reference(key_embeddings, key_seconds, trans_embeddings, trans_seconds, window_seconds):
+    """The full K x N scoring with out-of-window segments masked out."""
+    similarities = key_embeddings @ trans_embeddings.T
+    time_diffs = np.abs(key_seconds[:, None] - trans_seconds[None, :])
+    scores = 0.6 * similarities * 100 + 0.4 * np.maximum(0, 1 - time_diffs / 60.0) * 100
+    scores = np.where(time_diffs <= window_seconds, scores, -np.inf)
+    best_idx = np.argmax(scores, axis=1)
+    return best_idx, scores[np.arange(len(best_idx)), best_idx]
+
+
+def test_windowed_scoring_matches_the_masked_matrix():
+    rng = np.random.default_rng(0)
+    trans_seconds = np.sort(rng.uniform(0, 3600, 500))
+    trans_embeddings = rng.normal(size=(500, 16))
+    key_seconds = np.concatenate([rng.uniform(0, 3600, 20), [5000.0]])
+    key_embeddings = rng.normal(size=(21, 16))
+
+    best_idx, best_scores = score_key_points(key_embeddings, key_seconds, trans_embeddings, trans_seconds, 90.0)
+    expected_idx, expected_scores = masked_reference(key_embeddings, key_seconds, trans_embeddings, trans_seconds, 90.0)
+
+    assert np.allclose(best_scores[:-1], expected_scores[:-1])
+    assert (best_idx[:-1] == expected_idx[:-1]).all()
+    # Nothing within 90 seconds of the last key point
+    assert best_scores[-1] == -np.inf
+
+
+def test_unwindowed_scoring_considers_every_segment():
+    trans_seconds = np.array([0.0, 600.0, 1200.0])
+    trans_embeddings = np.eye(3)
+    best_idx, _ = score_key_points(np.eye(3)[[2]], np.array([0.0]), trans_embeddings, trans_seconds)
+    assert best_idx.tolist() == [2]
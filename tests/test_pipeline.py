@@ -0,0 +1,32 @@
+import asyncio
+
+from services.admission import overloaded
+from services.pipeline import run_staged
+
+
+async def collect(items: list, stages: list) -> list:
+    return [item async for item in run_staged(items, stages)]
+
+
+def test_failed_items_carry_a_readable_error_and_skip_later_stages():
+    mapped = []
+
+    async def transcribe(item):
+        if item["source"] == "busy":
+            raise overloaded(503, "transcribe stage is saturated", 2, 30)
+        if item["source"] == "broken":
+            raise ValueError("decoder exploded")
+        item["transcript"] = item["source"]
+
+    async def map_stage(item):
+        mapped.append(item["source"])
+        item["result"] = item["transcript"].upper()
+
+    items = [{"source": source} for source in ("ok", "busy", "broken")]
+    done = asyncio.run(collect(items, [("transcribe", 2, transcribe), ("map", 1, map_stage)]))
+
+    by_source = {item["source"]: item for item in done}
+    assert by_source["ok"]["result"] == "OK"
+    assert by_source["busy"]["error"] == "transcribe failed: transcribe stage is saturated"
+    assert by_source["broken"]["error"] == "transcribe failed: decoder exploded"
+    assert mapped == ["ok"]
@@ -0,0 +1,50 @@
+import hashlib
+import uuid
+
+import pytest
+
+from services.cache import LRUCache
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    import services.result_cache
+
+    cache = LRUCache(max_items=64)
+    monkeypatch.setattr(services.result_cache, "result_cache", cache)
+    return cache
+
+
+def test_auto_results_are_cached_under_the_resolved_profile(client, fake_media, memory_cache, monkeypatch):
+    import routes.upload
+
+    async def probe_upload(file):
+        return fake_media["duration"]
+
+    transcribed = []
+    collect_transcription = routes.upload.collect_transcription
+
+    async def counting_transcription(audio, on_segment=None, profile=None):
+        transcribed.append(profile["name"])
+        return await collect_transcription(audio, on_segment, profile)
+
+    monkeypatch.setattr(routes.upload, "probe_upload", probe_upload)
+    monkeypatch.setattr(routes.upload, "collect_transcription", counting_transcription)
+    content = uuid.uuid4().bytes
+    sha = hashlib.sha256(content).hexdigest()
+
+    response = client.post("/api/upload", files={"file": ("talk.mp4", content, "video/mp4")}, data={"profile": "auto"})
+    assert response.status_code == 200
+    # Short media on an idle server gets the accurate profile
+    assert transcribed == ["accurate"]
+    assert memory_cache.get(f"sha256:{sha}:accurate:mapped_data") is not None
+    assert memory_cache.get(f"sha256:{sha}:auto:transcript") is None
+
+    for profile in ("accurate", "auto"):
+        response = client.post("/api/upload", files={"file": ("talk.mp4", content, "video/mp4")}, data={"profile": profile})
+        assert response.json()["mapped_data"]
+    assert transcribed == ["accurate"]
+
+    response = client.post("/api/upload", files={"file": ("talk.mp4", content, "video/mp4")}, data={"profile": "fast"})
+    assert response.status_code == 200
+    assert transcribed == ["accurate", "fast"]
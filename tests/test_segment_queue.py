@@ -0,0 +1,42 @@
+import asyncio
+import queue
+import threading
+
+from services.transcriber import ChunkPlan, _drain_queue, _relay_queue
+
+
+def segment(start: float) -> dict:
+    return {"start": start, "end": start + 1, "text": f"at {start}"}
+
+
+async def drain(messages_in: list) -> tuple:
+    loop = asyncio.get_running_loop()
+    segment_queue, messages, stop = queue.Queue(), asyncio.Queue(), threading.Event()
+    plan = ChunkPlan()
+    plan.futures = [loop.create_future(), loop.create_future()]
+    plan.complete = True
+    plan.task = asyncio.create_task(asyncio.sleep(0))
+    relay = threading.Thread(target=_relay_queue, args=(segment_queue, loop, messages, stop), daemon=True)
+    relay.start()
+    for message in messages_in:
+        segment_queue.put(message)
+    try:
+        received = [item async for item in _drain_queue(messages, plan)]
+    finally:
+        stop.set()
+    relay.join(5)
+    return received, relay.is_alive(), loop._default_executor
+
+
+def test_segments_come_out_in_chunk_order_without_the_default_executor():
+    received, relay_alive, default_executor = asyncio.run(drain([
+        ("segment", 1, segment(60)),
+        ("segment", 0, segment(0)),
+        ("done", 1, 1),
+        ("segment", 0, segment(30)),
+        ("done", 0, 2),
+    ]))
+    assert received == [(0, segment(0)), (0, segment(30)), (1, segment(60))]
+    assert not relay_alive
+    # The blocking queue reads happen on the relay thread, not in asyncio's shared executor
+    assert default_executor is None
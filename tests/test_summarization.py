@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+import routes.summarization
+from routes.summarization import dedupe_key_points, split_transcript, summarize_lines
+from services.llm import StubLLMClient, estimate_tokens
+from services.transcript import seconds_to_hhmmss
+
+
+def transcript_lines(count: int, seconds_apart: int = 30) -> list:
+    return [f"{seconds_to_hhmmss(i * seconds_apart)} Speaker explains point number {i} in some detail." for i in range(count)]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    import services.llm
+
+    client = StubLLMClient(every=1)
+    monkeypatch.setattr(services.llm, "_client", client)
+    return client
+
+
+def test_split_transcript_keeps_chunks_within_budget_and_in_order():
+    lines = transcript_lines(40)
+    budget = 5 * estimate_tokens(lines[0])
+    chunks = split_transcript(lines, budget)
+
+    assert [line for chunk in chunks for line in chunk] == lines
+    assert all(sum(estimate_tokens(line) for line in chunk) <= budget for chunk in chunks)
+    assert len(chunks) == 8
+    # A line over the budget still gets a chunk of its own
+    assert split_transcript(["00:00:00 " + "word " * 100], 10) == [["00:00:00 " + "word " * 100]]
+
+
+def test_dedupe_key_points_drops_near_duplicates_and_sorts():
+    points = [
+        {"timestamp": "00:10:00", "text": "The speaker explains how caching works."},
+        {"timestamp": "00:01:00", "text": "Caching is introduced."},
+        {"timestamp": "00:12:00", "text": "The speaker explains how caching works!"},
+        {"timestamp": "00:05:00", "text": "Eviction policies are compared."},
+    ]
+    assert [point["timestamp"] for point in dedupe_key_points(points)] == ["00:01:00", "00:05:00", "00:10:00"]
+
+
+def test_map_reduce_summarizes_each_chunk_then_merges(stub, monkeypatch):
+    lines = transcript_lines(60)
+    # Repeat one insight in a later chunk; dedupe should keep only the first
+    lines[45] = f"{lines[45][:8]} {lines[3][9:]}"
+    budget = 10 * estimate_tokens(lines[0])
+    monkeypatch.setattr(routes.summarization, "SUMMARY_CHUNK_TOKENS", budget)
+    chunks = len(split_transcript(lines, budget))
+
+    key_points = asyncio.run(summarize_lines(lines, duration=1800))
+
+    # One call per chunk plus the reduce step
+    assert chunks > 1
+    assert stub.calls == chunks + 1
+    timestamps = [point["timestamp"] for point in key_points]
+    assert timestamps == sorted(timestamps)
+    assert set(timestamps) <= {line[:8] for line in lines}
+    assert lines[45][:8] not in timestamps
+    assert len(key_points) == 59
+
+
+def test_short_transcripts_take_a_single_call(stub):
+    key_points = asyncio.run(summarize_lines(transcript_lines(10), duration=300))
+    assert stub.calls == 1
+    assert len(key_points) == 10
+
+
+def test_map_reduce_falls_back_to_chunk_insights_when_reduce_is_unparseable(monkeypatch):
+    import services.llm
+
+    class NoReduce(StubLLMClient):
+        async def generate(self, prompt: str) -> str:
+            if "Candidate insights" in prompt:
+                self.calls += 1
+                return "Sorry, I cannot help with that."
+            return await super().generate(prompt)
+
+    client = NoReduce(every=1)
+    monkeypatch.setattr(services.llm, "_client", client)
+    lines = transcript_lines(30)
+    monkeypatch.setattr(routes.summarization, "SUMMARY_CHUNK_TOKENS", 10 * estimate_tokens(lines[0]))
+    key_points = asyncio.run(summarize_lines(lines, duration=900, mode="map_reduce"))
+    # The reduce step ran, and the merged chunk insights were kept
+    assert client.calls == len(split_transcript(lines, routes.summarization.SUMMARY_CHUNK_TOKENS)) + 1 == 4
+    assert len(key_points) == 30
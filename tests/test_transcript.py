@@ -0,0 +1,15 @@
+import pytest
+
+from services.transcript import hhmmss_to_seconds, seconds_to_hhmmss
+
+
+def test_hhmmss_round_trips_and_accepts_vtt_times():
+    assert hhmmss_to_seconds(seconds_to_hhmmss(3725)) == 3725
+    assert hhmmss_to_seconds("01:02.500") == pytest.approx(62.5)
+    # Hours past a day still parse, for very long streams
+    assert hhmmss_to_seconds("25:00:00") == 90000
+
+
+@pytest.mark.parametrize("timestamp", ["99:99:99", "00:60:00", "00:00:60", "1:2:3:4", "soon", ""])
+def test_out_of_range_or_malformed_timestamps_are_zero(timestamp):
+    assert hhmmss_to_seconds(timestamp) == 0.0
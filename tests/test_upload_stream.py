@@ -0,0 +1,42 @@
+import json
+import uuid
+
+
+def test_streaming_upload_emits_segments_before_the_result(client, fake_media):
+    lines = []
+    with client.stream(
+        "POST", "/api/upload",
+        files={"file": ("talk.mp4", uuid.uuid4().bytes, "video/mp4")}, data={"stream": "true"}
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        for line in response.iter_lines():
+            if line:
+                lines.append(json.loads(line))
+
+    assert len({event["job_id"] for event in lines}) == 1
+    segments = [event["segment"] for event in lines if "segment" in event]
+    assert [segment["timestamp"] for segment in segments] == [f"00:00:{i}0" for i in range(6)]
+    assert segments[0]["text"] == "Topic 0 is discussed here."
+
+    final = lines[-1]
+    assert final["type"] == "completed"
+    assert final["result"]["mapped_data"]
+    # Every segment arrives before summarization starts
+    first_summary = next(i for i, event in enumerate(lines) if event.get("stage") == "summarization")
+    assert max(i for i, event in enumerate(lines) if "segment" in event) < first_summary
+
+
+def test_streaming_upload_reports_failures(client, fake_media, monkeypatch):
+    import routes.upload
+
+    async def failing_transcription(audio, on_segment=None, profile=None):
+        raise RuntimeError("decoder exploded")
+
+    monkeypatch.setattr(routes.upload, "collect_transcription", failing_transcription)
+    response = client.post(
+        "/api/upload", files={"file": ("talk.mp4", uuid.uuid4().bytes, "video/mp4")}, data={"stream": "true"}
+    )
+    final = json.loads(response.text.strip().splitlines()[-1])
+    assert final["type"] == "failed"
+    assert "decoder exploded" in final["error"]